@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+AI作業監視デーモン v0.1
+差分チェック・プロンプト履歴チェックの状態をメモリ上に保持し、
+Unixドメインソケット経由で問い合わせに即座に応答する
+
+クライアント側は socket / json のみを使用し、重いimportを行わない
+"""
+
+import json
+import os
+import socket
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+MONITOR_BASE = os.path.join(os.path.expanduser('~'), '.ai-monitor')
+CLIENT_COMMANDS = ('status', 'changed', 'compliance', 'snapshot', 'ping', 'stop')
+# 応答待ちのタイムアウト（秒）。snapshot は大きなツリーのコピーを含むため長めに待つ
+CLIENT_TIMEOUT = 30.0
+CLIENT_TIMEOUTS = {'snapshot': 600.0}
+
+
+def get_socket_path(project_dir):
+    """プロジェクトごとのソケットパスを取得"""
+    project_name = os.path.basename(os.path.abspath(project_dir))
+    return os.path.join(MONITOR_BASE, 'run', f'{project_name}.sock')
+
+
+# ---------------------------------------------------------------------------
+# クライアント
+# ---------------------------------------------------------------------------
+
+def send_request(socket_path, request, timeout=CLIENT_TIMEOUT):
+    """デーモンにリクエストを送信し、応答を取得"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def print_response(command, response):
+    """応答を人が読める形式で表示"""
+    if not response.get('ok'):
+        print(f"エラー: {response.get('error')}")
+        return
+    result = response['result']
+    if command == 'status':
+        print(f"スナップショット: {result['snapshot']}")
+        print(f"追加: {result['added']} / 削除: {result['deleted']} / 変更: {result['modified']}")
+        print(f"要確認事項: {result['suspicious']} 件")
+        print(f"適合: {result['compliant_teams']}/{result['total_teams']} チーム")
+        print(f"応答時間: {result['elapsed_ms']:.1f} ms")
+    elif command == 'changed':
+        for label, key in (('追加', 'added_files'), ('削除', 'deleted_files'), ('変更', 'modified_files')):
+            for file in result[key]:
+                print(f"{label}: {file}")
+        for change in result['suspicious_changes']:
+            print(f"要確認: {change['file']}: {change['reason']}")
+    elif command == 'compliance':
+        summary = result['summary']
+        print(f"適合: {summary['compliant_teams']}/{summary['total_teams']} チーム")
+        for issue in summary['issues']:
+            print(f"- {issue}")
+    elif command == 'snapshot':
+        print(f"スナップショット作成完了: {result['snapshot']}")
+    else:
+        print(json.dumps(result, ensure_ascii=False))
+
+
+def run_client(command, project_dir, as_json):
+    """クライアントとして問い合わせを実行"""
+    socket_path = get_socket_path(project_dir)
+    try:
+        timeout = CLIENT_TIMEOUTS.get(command, CLIENT_TIMEOUT)
+        response = send_request(socket_path, {"command": command}, timeout=timeout)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"デーモンが起動していません: {socket_path}")
+        print(f"起動方法: python3 tools/ai-monitor.py serve {project_dir}")
+        sys.exit(2)
+    except socket.timeout:
+        print(f"デーモンから {timeout:g} 秒以内に応答がありませんでした: {socket_path}")
+        print("処理はデーモン側で継続している可能性があります。しばらくしてから status で確認してください")
+        sys.exit(2)
+    except OSError as e:
+        print(f"デーモンとの通信に失敗しました: {e}")
+        sys.exit(2)
+    except ValueError:
+        print(f"デーモンの応答を解釈できませんでした: {socket_path}")
+        sys.exit(2)
+
+    if as_json:
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+    else:
+        print_response(command, response)
+    if not response.get('ok'):
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# サーバー（serve 実行時のみ読み込む）
+# ---------------------------------------------------------------------------
+
+def load_tool(filename, module_name):
+    """ハイフン付きファイル名のツールをモジュールとして読み込む"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(TOOLS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class MonitorState:
+    """スナップショットと作業ツリーのフィンガープリントを保持"""
+
+    # プロンプト履歴チェックの対象ファイル名（チームごと、変更時のみ再スキャン）
+    COMPLIANCE_NAMES = ('work_history.log', 'prompt.txt')
+
+    def __init__(self, project_dir, snapshot_dir, diff_module, prompt_module):
+        from pathlib import Path
+        self.project_dir = Path(project_dir).resolve()
+        self.snapshot_dir = Path(snapshot_dir).resolve()
+        self.diff_module = diff_module
+        self.prompt_module = prompt_module
+        self.compliance_files = [
+            f'{team_dir}/{name}'
+            for team_dir, _ in prompt_module.PromptHistoryChecker.TEAMS
+            for name in self.COMPLIANCE_NAMES
+        ]
+        self.checker = diff_module.DiffChecker(self.snapshot_dir, self.project_dir)
+        self.baseline = {}   # 相対パス -> (hash, lines)
+        self.current = {}    # 相対パス -> (size, mtime_ns, hash, lines)
+        self.compliance_key = None
+        self.compliance_report = None
+        self.last_report = None
+        self.load_baseline()
+
+    def load_baseline(self, reuse_current=False):
+        """スナップショット側のフィンガープリントを作成（スナップショットは不変のため1回のみ）"""
+        tree = self.checker.original_tree  # ディレクトリ・パックのどちらでもよい
+        manifest = tree.load_manifest()
+        if manifest:
+            # create_snapshot が記録したマニフェストがあれば読み込みは不要
+            self.baseline = {file: (info["hash"], info["lines"]) for file, info in manifest["files"].items()}
+            return
+        baseline = {}
+        for file in tree.iter_files():
+            cached = self.current.get(file) if reuse_current else None
+            # copytreeはmtimeを保持するため、statが一致すれば作業ツリー側の値を再利用
+            if cached and tree.stat(file) == cached[:2]:
+                baseline[file] = cached[2:]
+                continue
+            baseline[file] = self.checker.fingerprint_tree_file(tree, file)
+        self.baseline = baseline
+
+    def refresh(self):
+        """作業ツリーをstatで走査し、変化したファイルのみ再ハッシュ"""
+        current = {}
+        rehashed = 0
+        for file in self.checker.list_files(self.project_dir):
+            path = self.project_dir / file
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            cached = self.current.get(file)
+            if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+                current[file] = cached
+            else:
+                current[file] = (st.st_size, st.st_mtime_ns) + self.checker.get_file_fingerprint(path)
+                rehashed += 1
+        self.current = current
+
+        modified = sorted(
+            file for file in self.baseline.keys() & current.keys()
+            if self.baseline[file][0] != current[file][2]
+        )
+        self.last_report = {
+            "snapshot": str(self.snapshot_dir),
+            "added_files": sorted(current.keys() - self.baseline.keys()),
+            "deleted_files": sorted(self.baseline.keys() - current.keys()),
+            "modified_files": modified,
+            "suspicious_changes": [
+                {"file": file, "reason": "保護されたファイルが変更されています"}
+                for file in modified if self.checker.is_protected(file)
+            ],
+            "rehashed_files": rehashed
+        }
+        return self.last_report
+
+    def refresh_compliance(self):
+        """対象ファイルのstatが変化した場合のみプロンプト履歴チェックを再実行"""
+        key = []
+        for name in self.compliance_files:
+            try:
+                st = (self.project_dir / name).stat()
+                key.append((name, st.st_size, st.st_mtime_ns))
+            except OSError:
+                key.append((name, None, None))
+        key = tuple(key)
+        if key != self.compliance_key:
+            checker = self.prompt_module.PromptHistoryChecker(self.project_dir)
+            checker.scan_all_teams()
+            self.compliance_report = checker.report
+            self.compliance_key = key
+        return self.compliance_report
+
+    def create_snapshot(self):
+        """新しいスナップショットを作成し、比較基準を更新"""
+        from pathlib import Path
+        self.refresh()
+        self.snapshot_dir = Path(self.checker.create_snapshot(self.project_dir)).resolve()
+        self.checker = self.diff_module.DiffChecker(self.snapshot_dir, self.project_dir)
+        self.load_baseline(reuse_current=True)
+        return {"snapshot": str(self.snapshot_dir)}
+
+    def handle(self, command):
+        """コマンドを処理して結果を返す"""
+        if command == 'ping':
+            return {"pid": os.getpid()}
+        if command == 'status':
+            report = self.refresh()
+            compliance = self.refresh_compliance()
+            return {
+                "snapshot": report["snapshot"],
+                "added": len(report["added_files"]),
+                "deleted": len(report["deleted_files"]),
+                "modified": len(report["modified_files"]),
+                "suspicious": len(report["suspicious_changes"]),
+                "compliant_teams": compliance["summary"]["compliant_teams"],
+                "total_teams": compliance["summary"]["total_teams"]
+            }
+        if command == 'changed':
+            return self.refresh()
+        if command == 'compliance':
+            return self.refresh_compliance()
+        if command == 'snapshot':
+            return self.create_snapshot()
+        raise ValueError(f"不明なコマンドです: {command}")
+
+
+def serve(project_dir, snapshot_dir=None):
+    """デーモンとして起動し、ソケットで待ち受ける"""
+    import socketserver
+    import threading
+    import time
+    from pathlib import Path
+
+    diff_module = load_tool('diff-checker.py', 'diff_checker')
+    prompt_module = load_tool('prompt-history-checker.py', 'prompt_history_checker')
+
+    project_dir = Path(project_dir).resolve()
+    if snapshot_dir is None:
+        latest = Path(MONITOR_BASE) / 'snapshots' / project_dir.name / 'latest'
+        if latest.exists():
+            snapshot_dir = latest.resolve()
+        else:
+            snapshot_dir = diff_module.DiffChecker("", "").create_snapshot(project_dir)
+            print(f"スナップショット作成完了: {snapshot_dir}")
+
+    socket_path = get_socket_path(project_dir)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        try:
+            send_request(socket_path, {"command": "ping"}, timeout=1.0)
+            print(f"デーモンは既に起動しています: {socket_path}")
+            sys.exit(1)
+        except OSError:
+            os.unlink(socket_path)  # 前回の異常終了で残ったソケット
+
+    state = MonitorState(project_dir, snapshot_dir, diff_module, prompt_module)
+    state.refresh()
+    state.refresh_compliance()
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            started = time.perf_counter()
+            try:
+                command = json.loads(line.decode('utf-8')).get('command')
+                if command == 'stop':
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    response = {"ok": True, "result": {"stopped": True}}
+                else:
+                    with lock:
+                        result = state.handle(command)
+                    if command == 'status':
+                        result["elapsed_ms"] = (time.perf_counter() - started) * 1000
+                    response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    print(f"監視デーモン起動: {socket_path}")
+    print(f"比較基準: {state.snapshot_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("監視デーモン終了")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    as_json = '--json' in sys.argv
+    snapshot_dir = None
+    if '--snapshot' in sys.argv:
+        index = sys.argv.index('--snapshot')
+        if index + 1 < len(sys.argv):
+            snapshot_dir = sys.argv[index + 1]
+            args.remove(snapshot_dir)
+
+    if not args or args[0] not in ('serve',) + CLIENT_COMMANDS:
+        print("使用方法: python3 ai-monitor.py serve [project_dir] [--snapshot snapshot_dir]")
+        print("または: python3 ai-monitor.py {status|changed|compliance|snapshot|stop} [project_dir] [--json]")
+        sys.exit(1)
+
+    command = args[0]
+    project_dir = args[1] if len(args) > 1 else '.'
+    if command == 'serve':
+        serve(project_dir, snapshot_dir)
+    else:
+        run_client(command, project_dir, as_json)
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,412 @@
 #!/usr/bin/env python3
 """
-AI作業監視用差分チェックツール v0.2
+AI作業監視用差分チェックツール v0.3
 ファイル構成と行数変化の視覚的レポート機能を追加
+v0.3: 走査・ハッシュ・差分・描画をasyncioパイプラインで並行処理
 """
 
 import os
 import sys
 import shutil
+import asyncio
 import hashlib
+import io
 import json
+import lzma
+import random
+import struct
+import tempfile
+import time
+import zlib
+import fnmatch
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import difflib
 import filecmp
 
+class DirectoryTree:
+    """通常のディレクトリを比較対象として読み込む"""
+    # create_snapshot が記録するマニフェスト（ドットファイルのため比較対象外）
+    MANIFEST_NAME = '.ai-monitor-manifest.json'
+    
+    def __init__(self, root, ignore_dirs=(), include_hidden=False):
+        self.root = Path(root)
+        self.ignore_dirs = set(ignore_dirs)
+        # パック化ではドットファイルも含める（マニフェストは索引に格納するため除く）
+        self.include_hidden = include_hidden
+    
+    def __str__(self):
+        return str(self.root)
+    
+    def iter_files(self):
+        """比較対象となるファイルの相対パスを走査順に返す"""
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in self.ignore_dirs]
+            rel_root = os.path.relpath(root, self.root)
+            prefix = '' if rel_root == '.' else rel_root + os.sep
+            for file in files:
+                if self.include_hidden:
+                    if not (prefix == '' and file == self.MANIFEST_NAME):
+                        yield prefix + file
+                elif not file.startswith('.'):
+                    yield prefix + file
+    
+    def read_bytes(self, file):
+        return (self.root / file).read_bytes()
+    
+    def iter_lines(self, file):
+        """ファイルを全体を読み込まずに1行ずつ返す（バイト列）"""
+        with open(self.root / file, 'rb') as f:
+            yield from f
+    
+    def stat(self, file):
+        """(サイズ, 更新時刻ns) を返す"""
+        st = (self.root / file).stat()
+        return st.st_size, st.st_mtime_ns
+    
+    def lookup_hash(self, file):
+        """記録済みのハッシュ値（ディレクトリでは常にNone）"""
+        return None
+    
+    def load_manifest(self):
+        """スナップショットのマニフェストを読み込む（なければNone）"""
+        path = self.root / self.MANIFEST_NAME
+        if not path.is_file():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+class SnapshotPack:
+    """スナップショットを1ファイルに圧縮格納したパック
+    
+    形式: [MAGIC][圧縮ブロブ...][zlib圧縮した索引JSON][索引オフセット 8バイト][MAGIC]
+    索引は相対パス -> ブロブの (offset, length) を保持し、任意のファイルを直接読み出せる。
+    同一内容のファイルはブロブを共有する。
+    """
+    MAGIC = b'AIMPACK1'
+    SUFFIX = '.pack'
+    TMP_SUFFIX = '.pack.tmp'
+    COMPRESSORS = {
+        "zlib": (lambda data: zlib.compress(data, 9), zlib.decompress),
+        "lzma": (lzma.compress, lzma.decompress)
+    }
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.fd = os.open(self.path, os.O_RDONLY)
+        try:
+            file_size = os.fstat(self.fd).st_size
+            # 途中で切れたファイルは末尾を読む前にサイズで弾く
+            if file_size < 32:
+                raise ValueError(f"パックファイルではありません: {self.path}")
+            trailer = os.pread(self.fd, 16, file_size - 16)
+            index_offset = struct.unpack('>Q', trailer[:8])[0]
+            if trailer[8:] != self.MAGIC or not len(self.MAGIC) <= index_offset <= file_size - 16:
+                raise ValueError(f"パックファイルではありません: {self.path}")
+            raw = os.pread(self.fd, file_size - 16 - index_offset, index_offset)
+            try:
+                self.index = json.loads(zlib.decompress(raw).decode('utf-8'))
+                self.decompress = self.COMPRESSORS[self.index["compression"]][1]
+            except (zlib.error, UnicodeDecodeError, json.JSONDecodeError, KeyError) as e:
+                raise ValueError(f"パックファイルの索引が壊れています: {self.path}") from e
+        except BaseException:
+            os.close(self.fd)
+            raise
+    
+    def __str__(self):
+        return str(self.path)
+    
+    @classmethod
+    def is_pack(cls, path):
+        return str(path).endswith(cls.SUFFIX) and Path(path).is_file()
+    
+    def close(self):
+        os.close(self.fd)
+    
+    def iter_files(self):
+        # ディレクトリと同様にドットファイルは比較対象外
+        return (file for file in self.index["files"] if not Path(file).name.startswith('.'))
+    
+    def matches(self, tree):
+        """格納したファイルの集合がツリーと一致するか（パック化後の削除前の確認）"""
+        return set(self.index["files"]) == set(tree.iter_files())
+    
+    def read_bytes(self, file):
+        # preadはファイル位置を共有しないため、複数スレッドから同時に読み出せる
+        entry = self.index["files"][file]
+        return self.decompress(os.pread(self.fd, entry["length"], entry["offset"]))
+    
+    def stat(self, file):
+        entry = self.index["files"][file]
+        return entry["size"], entry["mtime_ns"]
+    
+    def iter_lines(self, file):
+        yield from io.BytesIO(self.read_bytes(file))
+    
+    def lookup_hash(self, file):
+        return self.index["files"][file]["hash"]
+    
+    def load_manifest(self):
+        return self.index.get("manifest")
+    
+    @classmethod
+    def write(cls, path, tree, compression='zlib'):
+        """ツリーの内容をパックファイルに書き出す"""
+        path = Path(path)
+        compress = cls.COMPRESSORS[compression][0]
+        tmp_path = path.with_name(path.name + '.tmp')
+        try:
+            cls.write_pack_file(tmp_path, tree, compress, compression)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, path)
+        return cls(path)
+    
+    @classmethod
+    def write_pack_file(cls, tmp_path, tree, compress, compression):
+        """パックの内容を一時ファイルに書き出す"""
+        files = {}
+        blobs = {}  # hash -> (offset, length)
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.MAGIC)
+            for file in sorted(tree.iter_files()):
+                data = tree.read_bytes(file)
+                file_hash = hashlib.sha256(data).hexdigest()
+                if file_hash not in blobs:
+                    compressed = compress(data)
+                    blobs[file_hash] = (f.tell(), len(compressed))
+                    f.write(compressed)
+                size, mtime_ns = tree.stat(file)
+                offset, length = blobs[file_hash]
+                files[file] = {
+                    "hash": file_hash,
+                    "offset": offset,
+                    "length": length,
+                    "size": size,
+                    "mtime_ns": mtime_ns
+                }
+            index = {"version": 1, "compression": compression, "files": files}
+            manifest = tree.load_manifest()
+            if manifest:
+                index["manifest"] = manifest
+            index_offset = f.tell()
+            f.write(zlib.compress(json.dumps(index, ensure_ascii=False).encode('utf-8'), 9))
+            f.write(struct.pack('>Q', index_offset) + cls.MAGIC)
+
+
+class SnapshotStore:
+    """~/.ai-monitor/snapshots/<project>/ のスナップショット保持ポリシーとGC"""
+    TIMESTAMP_FORMAT = '%Y-%m-%d_%H%M%S'
+    # 間引きルール: (オプション名, 同一期間とみなすキー)
+    THINNING_RULES = [
+        ("hourly", '%Y-%m-%d %H'),
+        ("daily", '%Y-%m-%d'),
+        ("weekly", '%G-W%V')
+    ]
+    
+    def __init__(self, project_name, base_dir=None):
+        self.base_dir = Path(base_dir) if base_dir else Path.home() / '.ai-monitor' / 'snapshots'
+        self.project_dir = self.base_dir / project_name
+    
+    def list_snapshots(self):
+        """スナップショット一覧を新しい順に返す: [(datetime, [パス...])]"""
+        entries = {}
+        if not self.project_dir.exists():
+            return []
+        for path in self.project_dir.iterdir():
+            if path.is_symlink():
+                continue
+            name = path.name[:-len(SnapshotPack.SUFFIX)] if path.name.endswith(SnapshotPack.SUFFIX) else path.name
+            try:
+                taken_at = datetime.strptime(name, self.TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            entries.setdefault(taken_at, []).append(path)
+        return sorted(entries.items(), reverse=True)
+    
+    @classmethod
+    def select_kept(cls, timestamps, keep_last=5, hourly=24, daily=7, weekly=4):
+        """保持するスナップショットの時刻を選択
+        
+        直近keep_last件に加え、時間・日・週ごとに最新の1件を指定数まで残す
+        """
+        ordered = sorted(timestamps, reverse=True)
+        kept = set(ordered[:max(keep_last, 1)])
+        limits = {"hourly": hourly, "daily": daily, "weekly": weekly}
+        for name, key_format in cls.THINNING_RULES:
+            seen = set()
+            for taken_at in ordered:
+                if len(seen) >= limits[name]:
+                    break
+                key = taken_at.strftime(key_format)
+                if key not in seen:
+                    seen.add(key)
+                    kept.add(taken_at)
+        return kept
+    
+    def disk_usage(self):
+        """(バイト数, ファイル数) を返す"""
+        total_bytes = 0
+        total_files = 0
+        for root, dirs, files in os.walk(self.project_dir):
+            for file in files:
+                path = Path(root) / file
+                if not path.is_symlink():
+                    total_bytes += path.stat().st_size
+                    total_files += 1
+        return total_bytes, total_files
+    
+    def gc(self, keep_last=5, hourly=24, daily=7, weekly=4, keep_loose=1, compression='zlib', dry_run=False):
+        """期限切れのスナップショットを削除し、古いものをパック化"""
+        # 途中で失敗して削除だけが進まないよう、何も変更しないうちに検証する
+        if compression not in SnapshotPack.COMPRESSORS:
+            raise ValueError(f"compression には {'/'.join(SnapshotPack.COMPRESSORS)} のいずれかを指定してください: {compression}")
+        result = {"deleted": [], "packed": [], "kept": [], "mismatched": []}
+        result["bytes_before"], result["files_before"] = self.disk_usage()
+        
+        # 中断したGCが残した書きかけのパックを削除
+        if self.project_dir.exists():
+            for tmp_path in self.project_dir.glob('*' + SnapshotPack.TMP_SUFFIX):
+                result["deleted"].append(str(tmp_path))
+                if not dry_run:
+                    tmp_path.unlink()
+        snapshots = self.list_snapshots()
+        kept = self.select_kept([taken_at for taken_at, _ in snapshots], keep_last, hourly, daily, weekly)
+        
+        for taken_at, paths in snapshots:
+            packs = [p for p in paths if p.is_file()]
+            dirs = [p for p in paths if p.is_dir()]
+            if taken_at not in kept:
+                result["deleted"].extend(str(p) for p in paths)
+                if not dry_run:
+                    for path in paths:
+                        shutil.rmtree(path) if path.is_dir() else path.unlink()
+                continue
+            
+            result["kept"].append(taken_at.strftime(self.TIMESTAMP_FORMAT))
+            # 展開したまま残す件数は保持するスナップショットの中で数える
+            if len(result["kept"]) <= max(keep_loose, 1) or not dirs:
+                continue
+            pack_path = dirs[0].with_name(dirs[0].name + SnapshotPack.SUFFIX)
+            if dry_run:
+                if not packs:
+                    result["packed"].append(str(pack_path))
+                continue
+            # パック作成済み（前回のGCが中断した場合など）でも内容が揃っていなければ作り直す
+            tree = DirectoryTree(dirs[0], include_hidden=True)
+            pack = self.open_pack(packs[0]) if packs else None
+            if pack is None or not pack.matches(tree):
+                if pack is not None:
+                    pack.close()
+                result["packed"].append(str(pack_path))
+                pack = SnapshotPack.write(pack_path, tree, compression)
+            matched = pack.matches(tree)
+            pack.close()
+            if matched:
+                shutil.rmtree(dirs[0])
+            else:
+                # パックに入らなかったファイルがあれば元のディレクトリを残す
+                result["mismatched"].append(str(dirs[0]))
+        
+        if not dry_run:
+            self.update_latest_link()
+        result["bytes_after"], result["files_after"] = self.disk_usage()
+        return result
+    
+    def open_pack(self, path):
+        """既存のパックを開く（壊れていればNone）"""
+        try:
+            return SnapshotPack(path)
+        except ValueError:
+            return None
+    
+    def update_latest_link(self):
+        """latestリンクを残っている最新のスナップショットに向け直す"""
+        snapshots = self.list_snapshots()
+        latest_link = self.project_dir / 'latest'
+        if not snapshots:
+            return
+        target = sorted(snapshots[0][1], key=lambda p: p.is_file())[0].name
+        if latest_link.is_symlink() and os.readlink(latest_link) == target:
+            return
+        if latest_link.exists() or latest_link.is_symlink():
+            latest_link.unlink()
+        latest_link.symlink_to(target)
+
+
 class DiffChecker:
-    def __init__(self, original_dir, modified_dir):
+    # .gitとレポート関連ディレクトリを除外
+    IGNORE_DIRS = {'.git', '__pycache__', 'diff_reports', 'snapshots'}
+    # 変更を要確認とする保護ファイル
+    PROTECTED_FILES = ['MASTER_RULES.md', 'CLAUDE.md', 'README.md']
+    # 名前変更検出: 類似度のしきい値とMinHash/LSHのパラメータ
+    RENAME_SIMILARITY = 0.5
+    SHINGLE_SIZE = 3
+    MINHASH_PERMUTATIONS = 64
+    LSH_BANDS = 16
+    MINHASH_PRIME = (1 << 61) - 1
+    # 空ファイルのハッシュ値（内容で対応付けできないため名前変更検出から除外）
+    EMPTY_HASH = hashlib.sha256(b'').hexdigest()
+    # パイプラインで1回のキュー操作・スレッド呼び出しにまとめるファイル数
+    BATCH_SIZE = 256
+    # 時間制限モード: 優先的に検証するファイル名パターンと、未検証ファイルの変更リスク
+    BUDGET_RULE_PATTERNS = ['*RULES*.md', 'PERMISSIONS.md', 'work_history.log', 'prompt.txt']
+    BUDGET_RECENT_SECONDS = 3600
+    BUDGET_RISK_SAME_STAT = 0.01
+    BUDGET_RISK_MTIME_CHANGED = 0.5
+
+    def __init__(self, original_dir, modified_dir, hash_workers=4, diff_workers=2, queue_size=256):
+        for name, value in (("hash_workers", hash_workers), ("diff_workers", diff_workers), ("queue_size", queue_size)):
+            if value < 1:
+                raise ValueError(f"{name} には1以上を指定してください: {value}")
         self.original_dir = Path(original_dir)
         self.modified_dir = Path(modified_dir)
+        # ディレクトリ・パックファイルのどちらも比較対象にできる
+        self.original_tree = self.open_tree(original_dir)
+        self.modified_tree = self.open_tree(modified_dir)
+        # パイプラインの各ステージの並列数とキュー上限
+        self.concurrency = {
+            "hash_workers": hash_workers,
+            "diff_workers": diff_workers,
+            "queue_size": queue_size
+        }
+        self.render_diffs = True
+        self.fragment_spool = None
+        self.diff_fragments = {}  # ファイル -> 一時ファイル内の (offset, length)
         self.report = {
             "timestamp": datetime.now().isoformat(),
             "added_files": [],
             "deleted_files": [],
             "modified_files": [],
             "unchanged_files": [],
+            "renamed_files": [],
             "suspicious_changes": [],
-            "file_details": {}  # 追加：ファイル詳細情報
+            "errors": [],  # 読み込めなかったファイル
+            "file_details": {},  # 追加：ファイル詳細情報
+            "directory_summary": {}  # ディレクトリ別の変更集計
         }
         
     def create_snapshot(self, source_dir, snapshot_name=None):
         """作業前のスナップショットを作成"""
         # スナップショット保存先を.ai-monitorに変更
         monitor_base = Path.home() / '.ai-monitor' / 'snapshots'
-        project_name = Path(source_dir).name
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
+        project_name = Path(source_dir).resolve().name
+        timestamp = datetime.now().strftime(SnapshotStore.TIMESTAMP_FORMAT)
         snapshot_dir = monitor_base / project_name / timestamp
         
         # 新しいスナップショットを作成
         snapshot_dir.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copytree(source_dir, snapshot_dir, ignore=shutil.ignore_patterns('.git', '__pycache__', 'diff_reports', 'snapshots'))
+        shutil.copytree(source_dir, snapshot_dir, ignore=shutil.ignore_patterns(*self.IGNORE_DIRS))
+        
+        # ファイルごとのハッシュとディレクトリごとのMerkleハッシュを記録
+        manifest = self.build_manifest(DirectoryTree(snapshot_dir, self.IGNORE_DIRS))
+        with open(snapshot_dir / DirectoryTree.MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
         
         # latestシンボリックリンクを更新
         latest_link = monitor_base / project_name / 'latest'
@@ -48,11 +416,121 @@ class DiffChecker:
         
         return snapshot_dir
     
+    def build_manifest(self, tree, cache=None):
+        """ツリーのマニフェスト（ファイルのハッシュとディレクトリのMerkleハッシュ）を作成
+        
+        cache に別のマニフェストを渡すと、サイズと更新時刻が一致するファイルは
+        読み込まずにそのハッシュを再利用する。この stat の一致は信頼する前提のため、
+        同じサイズで書き換えて更新時刻を戻したファイルは検出できない。
+        ただし保護ファイル・ルールファイルは常に再ハッシュし、マニフェスト作成時刻
+        以降に更新されたファイルは（git の racy clean と同様に）再利用しない
+        """
+        created_at_ns = time.time_ns()
+        files = {}
+        for file in tree.iter_files():
+            try:
+                size, mtime_ns = tree.stat(file)
+                cached = self.reusable_entry(cache, file, size, mtime_ns)
+                if cached:
+                    files[file] = cached
+                    continue
+                file_hash, lines = self.fingerprint_tree_file(tree, file)
+                files[file] = {"hash": file_hash, "lines": lines, "size": size, "mtime_ns": mtime_ns}
+            except OSError as e:
+                # 壊れたシンボリックリンクなど。比較時にエラーとして報告する
+                files[file] = {"hash": None, "lines": 0, "size": None, "mtime_ns": None, "error": str(e)}
+        dirs = self.merkle_dirs({file: info["hash"] for file, info in files.items()})
+        return {"version": 1, "created_at_ns": created_at_ns, "files": files, "dirs": dirs}
+    
+    def reusable_entry(self, cache, file, size, mtime_ns):
+        """stat が一致し再利用してよいマニフェストのエントリ（なければNone）"""
+        cached = cache["files"].get(file) if cache else None
+        if (cached and cached["hash"] is not None
+                and (cached["size"], cached["mtime_ns"]) == (size, mtime_ns)
+                and mtime_ns < cache.get("created_at_ns", 0)
+                and not self.is_protected(file) and not self.is_rule_file(file)):
+            return cached
+        return None
+    
+    def merkle_dirs(self, file_hashes):
+        """相対パス -> ハッシュ から、ディレクトリごとの子の一覧とMerkleハッシュを求める"""
+        dir_names = {"."}
+        for file in file_hashes:
+            dir_names.update(str(parent) for parent in Path(file).parents)
+        dirs = {directory: {"files": [], "subdirs": []} for directory in dir_names}
+        for file in file_hashes:
+            dirs[str(Path(file).parent)]["files"].append(Path(file).name)
+        for directory in dir_names - {"."}:
+            dirs[str(Path(directory).parent)]["subdirs"].append(Path(directory).name)
+        # 子の名前とハッシュからディレクトリのハッシュを求める（深い階層から順に）
+        for directory in sorted(dir_names, key=lambda d: -len(Path(d).parts)):
+            entry = dirs[directory]
+            entry["files"].sort()
+            entry["subdirs"].sort()
+            digest = hashlib.sha256()
+            for name in entry["files"]:
+                digest.update(f'f {name} {file_hashes[self.join_path(directory, name)]}\n'.encode('utf-8'))
+            for name in entry["subdirs"]:
+                digest.update(f'd {name} {dirs[self.join_path(directory, name)]["hash"]}\n'.encode('utf-8'))
+            entry["hash"] = digest.hexdigest()
+        return dirs
+    
+    def iter_manifest_files(self, manifest, directory):
+        """マニフェスト上のディレクトリ配下の全ファイルを返す"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            entry = manifest["dirs"][current]
+            for name in entry["files"]:
+                yield self.join_path(current, name)
+            stack.extend(self.join_path(current, name) for name in entry["subdirs"])
+    
+    def join_path(self, directory, name):
+        """マニフェスト上の相対パスを結合"""
+        return name if directory == "." else f'{directory}/{name}'
+    
     def get_file_hash(self, filepath):
         """ファイルのハッシュ値を計算"""
         with open(filepath, 'rb') as f:
             return hashlib.sha256(f.read()).hexdigest()
     
+    def get_file_fingerprint(self, filepath):
+        """ハッシュ値と行数を1回の読み込みで取得"""
+        with open(filepath, 'rb') as f:
+            return self.fingerprint_bytes(f.read())
+    
+    def fingerprint_bytes(self, data):
+        """ファイル内容からハッシュ値と行数を計算"""
+        try:
+            lines = len(io.StringIO(data.decode('utf-8'), newline=None).readlines())
+        except UnicodeDecodeError:
+            lines = 0
+        return hashlib.sha256(data).hexdigest(), lines
+    
+    def fingerprint_tree_file(self, tree, file):
+        """ツリー（ディレクトリ・パック）内のファイルのハッシュ値と行数を取得"""
+        return self.fingerprint_bytes(tree.read_bytes(file))
+    
+    def fingerprint_batch(self, tree, files, cache=None):
+        """複数ファイルをまとめてフィンガープリント: ([(file, hash, lines, error)], 読まずに済んだ件数)
+        
+        cache にマニフェストを渡すと、build_manifest と同じ条件で stat が一致するファイルは読まない
+        """
+        results = []
+        reused = 0
+        for file in files:
+            try:
+                cached = self.reusable_entry(cache, file, *tree.stat(file)) if cache else None
+                if cached:
+                    results.append((file, cached["hash"], cached["lines"], None))
+                    reused += 1
+                    continue
+                file_hash, lines = self.fingerprint_tree_file(tree, file)
+                results.append((file, file_hash, lines, None))
+            except OSError as e:
+                results.append((file, None, 0, str(e)))
+        return results, reused
+    
     def count_lines(self, filepath):
         """ファイルの行数をカウント"""
         try:
@@ -61,115 +539,648 @@ class DiffChecker:
         except:
             return 0
     
-    def compare_directories(self):
-        """ディレクトリ間の差分を検出"""
-        # 全ファイルのリストを取得
-        original_files = set()
-        modified_files = set()
+    def open_tree(self, path):
+        """パスに応じてディレクトリまたはパックファイルを開く"""
+        if SnapshotPack.is_pack(path):
+            return SnapshotPack(path)
+        return DirectoryTree(path, self.IGNORE_DIRS)
+    
+    def iter_files(self, base_dir):
+        """比較対象となるファイルの相対パスを走査順に返す"""
+        return self.open_tree(base_dir).iter_files()
+    
+    def list_files(self, base_dir):
+        """比較対象となるファイルの相対パス一覧を取得"""
+        return set(self.iter_files(base_dir))
+    
+    def is_protected(self, filepath):
+        """保護されたファイルかどうかを判定"""
+        return any(protected in filepath for protected in self.PROTECTED_FILES)
+    
+    def is_rule_file(self, filepath):
+        """ルール・権限・作業記録ファイルかどうかを判定"""
+        return any(fnmatch.fnmatch(Path(filepath).name, pattern) for pattern in self.BUDGET_RULE_PATTERNS)
+    
+    def compare_directories(self, render_diffs=True):
+        """ディレクトリ間の差分を検出（パイプライン処理の同期ラッパー）"""
+        asyncio.run(self.compare_directories_async(render_diffs))
+    
+    async def compare_directories_async(self, render_diffs=True):
+        """走査・ハッシュ・差分・描画を並行に流すパイプラインで差分を検出
         
-        # .gitとレポート関連ディレクトリを除外
-        ignore_dirs = {'.git', '__pycache__', 'diff_reports', 'snapshots'}
+        各ステージは上限付きキューで接続されており、後段が詰まると前段が待機する
+        （バックプレッシャー）ため、ツリーの大きさに関わらずメモリ使用量が抑えられる
+        """
+        loop = asyncio.get_running_loop()
+        workers = self.concurrency
+        executor = ThreadPoolExecutor(
+            max_workers=2 + workers["hash_workers"] + workers["diff_workers"])
+        walk_queue = asyncio.Queue(workers["queue_size"])
+        fingerprint_queue = asyncio.Queue(workers["queue_size"])
+        diff_queue = asyncio.Queue(workers["queue_size"])
+        render_queue = asyncio.Queue(workers["queue_size"])
+        done = object()
+        # 異常終了時に走査スレッドを起こして終了させるためのフラグ
+        stop = threading.Event()
         
-        for root, dirs, files in os.walk(self.original_dir):
-            dirs[:] = [d for d in dirs if d not in ignore_dirs]
-            for file in files:
-                if not file.startswith('.'):
-                    rel_path = Path(root).relative_to(self.original_dir) / file
-                    original_files.add(str(rel_path))
+        def enqueue(item):
+            # キューが満杯なら待機するが、停止要求があれば諦めて False を返す
+            try:
+                future = asyncio.run_coroutine_threadsafe(walk_queue.put(item), loop)
+            except RuntimeError:
+                return False
+            while not stop.is_set():
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    continue
+                except concurrent.futures.CancelledError:
+                    return False
+            future.cancel()
+            return False
         
-        for root, dirs, files in os.walk(self.modified_dir):
-            dirs[:] = [d for d in dirs if d not in ignore_dirs]
-            for file in files:
-                if not file.startswith('.'):
-                    rel_path = Path(root).relative_to(self.modified_dir) / file
-                    modified_files.add(str(rel_path))
-        
-        # 追加されたファイル
-        self.report["added_files"] = list(modified_files - original_files)
-        
-        # 削除されたファイル
-        self.report["deleted_files"] = list(original_files - modified_files)
-        
-        # すべてのファイルの詳細情報を収集
-        all_files = original_files | modified_files
-        for file in sorted(all_files):
-            file_info = {
-                "before": {"exists": False, "lines": 0},
-                "after": {"exists": False, "lines": 0},
-                "status": "unchanged"
-            }
+        def walk(side, tree):
+            # 走査結果を BATCH_SIZE 件ずつまとめてキューへ
+            batch = []
+            for file in tree.iter_files():
+                batch.append(file)
+                if len(batch) >= self.BATCH_SIZE:
+                    if not enqueue((side, batch)):
+                        return
+                    batch = []
+            if batch:
+                enqueue((side, batch))
+        
+        async def walk_stage(sides):
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, walk, side, tree) for side, tree in sides))
+            for _ in range(workers["hash_workers"]):
+                await walk_queue.put(done)
+        
+        async def manifest_stage(manifest):
+            # マニフェストのある比較元は読み込まず、記録済みのハッシュをディレクトリ単位で流す
+            for directory, entry in manifest["dirs"].items():
+                results = []
+                for name in entry["files"]:
+                    file = self.join_path(directory, name)
+                    info = manifest["files"][file]
+                    results.append((file, info["hash"], info["lines"], info.get("error")))
+                if results:
+                    await fingerprint_queue.put(("before", results))
+            await fingerprint_queue.put(done)
+        
+        async def merkle_stage(original_manifest, modified_manifest):
+            # 両側にマニフェストがあれば、Merkleハッシュが一致するサブツリーは未変更とし、
+            # 異なるディレクトリのファイルだけを既知のハッシュ付きで後段へ流す
+            skipped_dirs, skipped_files = 0, 0
+            stack = ["."]
+            while stack:
+                directory = stack.pop()
+                entries = (original_manifest["dirs"].get(directory), modified_manifest["dirs"].get(directory))
+                if entries[0] and entries[1] and entries[0]["hash"] == entries[1]["hash"]:
+                    for file in self.iter_manifest_files(original_manifest, directory):
+                        lines = original_manifest["files"][file]["lines"]
+                        self.report["unchanged_files"].append(file)
+                        self.report["file_details"][file] = {
+                            "before": {"exists": True, "lines": lines},
+                            "after": {"exists": True, "lines": lines},
+                            "status": "unchanged"
+                        }
+                        skipped_files += 1
+                    skipped_dirs += 1
+                    continue
+                subdirs = set()
+                for side, manifest, entry in zip(("before", "after"), (original_manifest, modified_manifest), entries):
+                    if entry is None:
+                        continue
+                    subdirs.update(entry["subdirs"])
+                    results = []
+                    for name in entry["files"]:
+                        file = self.join_path(directory, name)
+                        info = manifest["files"][file]
+                        results.append((file, info["hash"], info["lines"], info.get("error")))
+                    if results:
+                        await fingerprint_queue.put((side, results))
+                stack.extend(self.join_path(directory, name) for name in sorted(subdirs))
+            self.report["merkle"] = {"skipped_directories": skipped_dirs, "skipped_files": skipped_files}
+            await fingerprint_queue.put(done)
+        
+        async def fingerprint_stage(cache):
+            # cache（比較元のマニフェスト）があれば、statが一致する作業ツリー側のファイルは読まない
+            while (item := await walk_queue.get()) is not done:
+                side, files = item
+                tree = self.original_tree if side == "before" else self.modified_tree
+                results, reused = await loop.run_in_executor(
+                    executor, self.fingerprint_batch, tree, files, cache if side == "after" else None)
+                reused_counts.append(reused)
+                await fingerprint_queue.put((side, results))
+            await fingerprint_queue.put(done)
+        
+        async def join_stage(sources):
+            # 両側のフィンガープリントが揃った時点で判定し、変更ファイルを差分ステージへ流す
+            pending = {}
+            finished = 0
+            while finished < sources:
+                item = await fingerprint_queue.get()
+                if item is done:
+                    finished += 1
+                    continue
+                side, results = item
+                for file, file_hash, lines, error in results:
+                    if modified_hashes is not None and side == "after":
+                        modified_hashes[file] = file_hash
+                    if error:
+                        self.report["errors"].append({"file": file, "side": side, "error": error})
+                    other = pending.pop(file, None)
+                    if other is None:
+                        pending[file] = (side, file_hash, lines)
+                        continue
+                    before, after = (other[1:], (file_hash, lines)) if side == "after" else ((file_hash, lines), other[1:])
+                    file_info = {
+                        "before": {"exists": True, "lines": before[1]},
+                        "after": {"exists": True, "lines": after[1]},
+                        "status": "unchanged"
+                    }
+                    if before[0] is None or after[0] is None:
+                        file_info["status"] = "error"
+                    elif before[0] != after[0]:
+                        file_info["status"] = "modified"
+                        self.record_modified(file)
+                        await diff_queue.put((file, file, file_info))
+                    else:
+                        self.report["unchanged_files"].append(file)
+                    self.report["file_details"][file] = file_info
             
-            # Before側の情報
-            if file in original_files:
-                orig_path = self.original_dir / file
-                file_info["before"]["exists"] = True
-                file_info["before"]["lines"] = self.count_lines(orig_path)
+            # 片側にしか存在しないファイルから名前変更・移動を検出
+            # （読み込めなかったもの・空ファイルは git と同様に対象外）
+            candidates = {file: entry for file, entry in pending.items()
+                          if entry[1] and entry[1] != self.EMPTY_HASH}
+            deleted = {file: entry[1:] for file, entry in candidates.items() if entry[0] == "before"}
+            added = {file: entry[1:] for file, entry in candidates.items() if entry[0] == "after"}
+            renames = await loop.run_in_executor(executor, self.detect_renames, deleted, added)
+            for old_file, new_file, similarity in renames:
+                pending.pop(old_file)
+                pending.pop(new_file)
+                # 類似度は空白を除いた行で計算するため、内容の同一性はハッシュで判定
+                identical = deleted[old_file][0] == added[new_file][0]
+                self.report["renamed_files"].append({
+                    "from": old_file,
+                    "to": new_file,
+                    "similarity": round(similarity, 3),
+                    "identical": identical
+                })
+                self.report["file_details"][new_file] = {
+                    "before": {"exists": True, "lines": deleted[old_file][1]},
+                    "after": {"exists": True, "lines": added[new_file][1]},
+                    "status": "renamed",
+                    "from": old_file
+                }
+                if self.is_protected(old_file) or self.is_protected(new_file):
+                    self.report["suspicious_changes"].append({
+                        "file": new_file,
+                        "reason": f"保護されたファイルが移動されています（{old_file} から）"
+                    })
+                if not identical:
+                    await diff_queue.put((new_file, old_file, self.report["file_details"][new_file]))
             
-            # After側の情報
-            if file in modified_files:
-                mod_path = self.modified_dir / file
-                file_info["after"]["exists"] = True
-                file_info["after"]["lines"] = self.count_lines(mod_path)
+            # 残りは追加・削除
+            for file, (side, file_hash, lines) in pending.items():
+                exists_before = side == "before"
+                self.report["file_details"][file] = {
+                    "before": {"exists": exists_before, "lines": lines if exists_before else 0},
+                    "after": {"exists": not exists_before, "lines": 0 if exists_before else lines},
+                    "status": "deleted" if exists_before else "added"
+                }
+                self.report["deleted_files" if exists_before else "added_files"].append(file)
+            for _ in range(workers["diff_workers"]):
+                await diff_queue.put(done)
+        
+        async def diff_stage():
+            # 変更ファイルはすべて行数の増減（churn）を計算し、差分テキストは要求時のみ描画
+            while (item := await diff_queue.get()) is not done:
+                file, original_file, file_info = item
+                if file_info["before"]["lines"] or file_info["after"]["lines"]:
+                    try:
+                        added, removed = await loop.run_in_executor(
+                            executor, self.compute_churn, file, original_file)
+                        file_info["churn"] = {"added": added, "removed": removed}
+                    except OSError as e:
+                        # ハッシュ計算後に作業ツリーから削除された場合など。記録して比較は続ける
+                        side = "before" if e.filename and str(e.filename).startswith(str(self.original_tree)) else "after"
+                        self.report["errors"].append({"file": file, "side": side, "error": str(e)})
+                if not render_diffs:
+                    continue
+                fragment = await loop.run_in_executor(
+                    executor, self.render_diff_fragment, file, original_file)
+                await render_queue.put((file, fragment))
+            await render_queue.put(done)
+        
+        async def writer_stage():
+            # 描画済みの断片は一時ファイルへ書き出し、メモリに溜めない
+            finished = 0
+            while finished < workers["diff_workers"]:
+                item = await render_queue.get()
+                if item is done:
+                    finished += 1
+                    continue
+                file, fragment = item
+                data = fragment.encode('utf-8')
+                offset = self.fragment_spool.seek(0, os.SEEK_END)
+                self.fragment_spool.write(data)
+                self.diff_fragments[file] = (offset, len(data))
+        
+        if render_diffs:
+            self.fragment_spool = tempfile.TemporaryFile()
+        original_manifest = self.original_tree.load_manifest()
+        modified_manifest = self.modified_tree.load_manifest() if original_manifest else None
+        modified_hashes = None  # 作業ツリー側のMerkleハッシュ計算用（相対パス -> hash）
+        reused_counts = []
+        try:
+            # join_stage は fingerprint_queue に done を流すステージの数だけ終了を待つ
+            if original_manifest and modified_manifest:
+                # 両側がスナップショットなら変化したサブツリーのみ辿る（読み込みなし）
+                source_stages = [merkle_stage(original_manifest, modified_manifest)]
+                sources = 1
+            elif original_manifest:
+                # 作業ツリー側は走査・ハッシュのステージで流し、比較元はマニフェストから流す
+                modified_hashes = {}
+                source_stages = [walk_stage([("after", self.modified_tree)]), manifest_stage(original_manifest),
+                                 *(fingerprint_stage(original_manifest) for _ in range(workers["hash_workers"]))]
+                sources = workers["hash_workers"] + 1
+            else:
+                source_stages = [walk_stage([("before", self.original_tree), ("after", self.modified_tree)]),
+                                 *(fingerprint_stage(None) for _ in range(workers["hash_workers"]))]
+                sources = workers["hash_workers"]
+            await asyncio.gather(
+                *source_stages,
+                join_stage(sources),
+                *(diff_stage() for _ in range(workers["diff_workers"])),
+                writer_stage())
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if modified_hashes is not None:
+            # 作業ツリー側のMerkleハッシュを求め、比較元と一致したサブツリー（最上位のみ）を数える
+            original_dirs = original_manifest["dirs"]
+            modified_dirs = self.merkle_dirs(modified_hashes)
+            unchanged = {directory for directory, entry in modified_dirs.items()
+                         if directory in original_dirs and original_dirs[directory]["hash"] == entry["hash"]}
+            self.report["merkle"] = {
+                "skipped_directories": sum(1 for d in unchanged if d == "." or str(Path(d).parent) not in unchanged),
+                "skipped_files": sum(reused_counts)
+            }
+        
+        # 並行処理による順序の揺れをなくす
+        for key in ("added_files", "deleted_files", "modified_files", "unchanged_files"):
+            self.report[key].sort()
+        self.report["suspicious_changes"].sort(key=lambda change: change["file"])
+        self.report["renamed_files"].sort(key=lambda rename: rename["to"])
+        self.report["errors"].sort(key=lambda error: (error["file"], error["side"]))
+        self.report["file_details"] = dict(sorted(self.report["file_details"].items()))
+        self.report["directory_summary"] = self.summarize_directories()
+    
+    def summarize_directories(self):
+        """変更をディレクトリごと（祖先ディレクトリにも積み上げ）に集計
+        
+        名前変更・移動は移動元・移動先の両方の祖先ディレクトリに1回ずつ計上する
+        """
+        summary = {}
+        for file, details in self.report["file_details"].items():
+            status = details["status"]
+            if status not in ("added", "deleted", "modified", "renamed"):
+                continue
+            before_lines, after_lines = details["before"]["lines"], details["after"]["lines"]
+            if before_lines is None or after_lines is None:
+                # 時間制限モードで行数が不明なものは件数のみ集計
+                delta = 0
+            else:
+                delta = after_lines - before_lines
+            churn = details.get("churn", {"added": max(delta, 0), "removed": max(-delta, 0)})
+            directories = set(Path(file).parents)
+            if status == "renamed":
+                directories.update(Path(details["from"]).parents)
+            for directory in directories:
+                entry = summary.setdefault(str(directory), {
+                    "added": 0, "deleted": 0, "modified": 0, "renamed": 0,
+                    "lines_added": 0, "lines_removed": 0
+                })
+                entry[status] += 1
+                entry["lines_added"] += churn["added"]
+                entry["lines_removed"] += churn["removed"]
+        return dict(sorted(summary.items()))
+    
+    def detect_renames(self, deleted, added):
+        """削除・追加ファイルの組から名前変更・移動を検出
+        
+        deleted/added は 相対パス -> (hash, lines)。
+        完全一致はハッシュ索引で O(n)、内容が変わったものは行シングルのMinHash署名を
+        LSHでバケット化し、同じバケットに入った候補だけを比較する。
+        戻り値: [(元のパス, 新しいパス, 類似度)]
+        """
+        renames = []
+        
+        # 完全一致: ハッシュ -> 削除ファイルの索引（同名ファイルを優先して対応付け）
+        deleted_by_hash = {}
+        for file, (file_hash, _) in deleted.items():
+            deleted_by_hash.setdefault(file_hash, []).append(file)
+        unmatched_added = []
+        for file, (file_hash, _) in sorted(added.items()):
+            candidates = deleted_by_hash.get(file_hash)
+            if not candidates:
+                unmatched_added.append(file)
+                continue
+            same_name = [c for c in candidates if Path(c).name == Path(file).name]
+            old_file = (same_name or candidates)[0]
+            candidates.remove(old_file)
+            renames.append((old_file, file, 1.0))
+        unmatched_deleted = [f for files in deleted_by_hash.values() for f in files]
+        if not unmatched_added or not unmatched_deleted:
+            return renames
+        
+        # 類似一致: MinHash署名をLSHバンドでバケット化
+        signatures = {}
+        buckets = {}
+        rows = self.MINHASH_PERMUTATIONS // self.LSH_BANDS
+        for side, tree, files in (("before", self.original_tree, unmatched_deleted),
+                                  ("after", self.modified_tree, unmatched_added)):
+            for file in files:
+                signature = self.minhash_signature(tree, file)
+                if signature is None:
+                    continue
+                signatures[(side, file)] = signature
+                for band in range(self.LSH_BANDS):
+                    key = (band, signature[band * rows:(band + 1) * rows])
+                    buckets.setdefault(key, {"before": set(), "after": set()})[side].add(file)
+        
+        candidates = set()
+        for bucket in buckets.values():
+            for old_file in bucket["before"]:
+                for new_file in bucket["after"]:
+                    candidates.add((old_file, new_file))
+        scored = []
+        for old_file, new_file in candidates:
+            a = signatures[("before", old_file)]
+            b = signatures[("after", new_file)]
+            similarity = sum(x == y for x, y in zip(a, b)) / len(a)
+            if similarity >= self.RENAME_SIMILARITY:
+                scored.append((similarity, old_file, new_file))
+        
+        # 類似度の高い組から確定
+        used_old, used_new = set(), set()
+        for similarity, old_file, new_file in sorted(scored, key=lambda c: (-c[0], c[1], c[2])):
+            if old_file in used_old or new_file in used_new:
+                continue
+            used_old.add(old_file)
+            used_new.add(new_file)
+            renames.append((old_file, new_file, similarity))
+        return renames
+    
+    def minhash_signature(self, tree, filepath):
+        """行シングルのMinHash署名を計算（テキストとして読めない・空のファイルはNone）"""
+        try:
+            lines = [line.strip() for line in self.read_lines(tree, filepath)]
+        except (UnicodeDecodeError, OSError):
+            return None
+        if not lines:
+            return None
+        size = min(self.SHINGLE_SIZE, len(lines))
+        shingles = {
+            int.from_bytes(hashlib.blake2b(
+                '\n'.join(lines[i:i + size]).encode('utf-8'), digest_size=8).digest(), 'big')
+            for i in range(len(lines) - size + 1)
+        }
+        return tuple(
+            min((a * x + b) % self.MINHASH_PRIME for x in shingles)
+            for a, b in self.minhash_coefficients()
+        )
+    
+    def minhash_coefficients(self):
+        """MinHashのハッシュ関数係数（両ツリーで共通にするため固定シード）"""
+        if not hasattr(self, '_minhash_coefficients'):
+            rng = random.Random(0)
+            self._minhash_coefficients = [
+                (rng.randrange(1, self.MINHASH_PRIME), rng.randrange(0, self.MINHASH_PRIME))
+                for _ in range(self.MINHASH_PERMUTATIONS)
+            ]
+        return self._minhash_coefficients
+    
+    def compare_with_budget(self, time_budget):
+        """制限時間内で、疑わしいファイルから順にハッシュ検証する近似比較
+        
+        まずstat（サイズ・更新時刻）で分類し、サイズが異なるものは読まずに変更と確定する。
+        残り時間で保護ファイル・ルール関連・最近の変更・更新時刻の変化の順に検証し、
+        検証できなかったファイルは「おそらく未変更」「未検証」として信頼度とともに報告する。
+        内容を読んでいないファイルの行数は、マニフェストから分かるもの以外は不明（None）とする。
+        """
+        started = time.monotonic()
+        deadline = started + time_budget
+        self.render_diffs = False
+        manifest = self.original_tree.load_manifest()
+        known = manifest["files"] if manifest else {}
+        original_files = set(self.original_tree.iter_files())
+        modified_files = set(self.modified_tree.iter_files())
+        now = time.time()
+        
+        def lines_before(file):
+            return known[file]["lines"] if file in known else None
+        
+        def record_error(file, side, error):
+            # 通常の比較と同様に、読めないファイルは記録して続行する
+            self.report["errors"].append({"file": file, "side": side, "error": str(error)})
+        
+        candidates = []
+        for file in sorted(original_files | modified_files):
+            if file not in modified_files:
+                self.report["deleted_files"].append(file)
+                self.report["file_details"][file] = {
+                    "before": {"exists": True, "lines": lines_before(file)},
+                    "after": {"exists": False, "lines": 0},
+                    "status": "deleted"
+                }
+                continue
+            if file not in original_files:
+                self.report["added_files"].append(file)
+                self.report["file_details"][file] = {
+                    "before": {"exists": False, "lines": 0},
+                    "after": {"exists": True, "lines": None},
+                    "status": "added",
+                    "verified": True
+                }
+                continue
             
-            # ステータス判定
-            if not file_info["before"]["exists"]:
-                file_info["status"] = "added"
-            elif not file_info["after"]["exists"]:
-                file_info["status"] = "deleted"
-            elif file in original_files and file in modified_files:
-                orig_path = self.original_dir / file
-                mod_path = self.modified_dir / file
-                if self.get_file_hash(orig_path) != self.get_file_hash(mod_path):
-                    file_info["status"] = "modified"
-                    
-                    # 保護されたファイルの変更を検出
-                    protected_files = ['MASTER_RULES.md', 'CLAUDE.md', 'README.md']
-                    if any(protected in file for protected in protected_files):
-                        self.report["suspicious_changes"].append({
-                            "file": file,
-                            "reason": "保護されたファイルが変更されています"
-                        })
+            details = {
+                "before": {"exists": True, "lines": lines_before(file)},
+                "after": {"exists": True, "lines": None},
+                "status": "error",
+                "verified": False
+            }
+            self.report["file_details"][file] = details
+            stats = {}
+            for side, tree in (("before", self.original_tree), ("after", self.modified_tree)):
+                try:
+                    stats[side] = tree.stat(file)
+                except OSError as e:
+                    record_error(file, side, e)
+            if len(stats) < 2:
+                continue
+            before_stat, after_stat = stats["before"], stats["after"]
+            details["status"] = "probably_unchanged" if before_stat == after_stat else "unverified"
+            if before_stat[0] != after_stat[0]:
+                # サイズが異なれば内容を読まずに変更と確定
+                details["status"] = "modified"
+                details["verified"] = True
+                self.record_modified(file)
+                continue
             
-            self.report["file_details"][file] = file_info
+            priority = 0
+            if self.is_protected(file):
+                priority += 100
+            if self.is_rule_file(file):
+                priority += 50
+            if before_stat != after_stat:
+                priority += 30
+            if now - after_stat[1] / 1e9 < self.BUDGET_RECENT_SECONDS:
+                priority += 20
+            candidates.append((-priority, -after_stat[1], file))
         
-        # 既存のレポート形式も維持
-        common_files = original_files & modified_files
-        for file in common_files:
-            orig_path = self.original_dir / file
-            mod_path = self.modified_dir / file
-            
-            if self.get_file_hash(orig_path) != self.get_file_hash(mod_path):
-                self.report["modified_files"].append(file)
+        # 疑わしい順にハッシュで検証
+        verified = 0
+        for _, _, file in sorted(candidates):
+            if time.monotonic() >= deadline:
+                break
+            details = self.report["file_details"][file]
+            try:
+                if file in known:
+                    before_hash, before_lines = known[file]["hash"], known[file]["lines"]
+                else:
+                    side = "before"
+                    before_hash, before_lines = self.fingerprint_tree_file(self.original_tree, file)
+                side = "after"
+                after_hash, after_lines = self.fingerprint_tree_file(self.modified_tree, file)
+            except OSError as e:
+                record_error(file, side, e)
+                details["status"] = "error"
+                continue
+            details["before"]["lines"] = before_lines
+            details["after"]["lines"] = after_lines
+            details["verified"] = True
+            verified += 1
+            if before_hash != after_hash:
+                details["status"] = "modified"
+                self.record_modified(file)
             else:
+                details["status"] = "unchanged"
                 self.report["unchanged_files"].append(file)
-    
-    def show_file_diff(self, filepath):
-        """特定ファイルの差分を表示"""
-        orig_path = self.original_dir / filepath
-        mod_path = self.modified_dir / filepath
         
-        with open(orig_path, 'r', encoding='utf-8') as f:
-            orig_lines = f.readlines()
+        # 時間が残れば、読まずに確定したファイル（追加・削除・サイズ変化）の行数を読み込む
+        for file, details in self.report["file_details"].items():
+            if details["status"] not in ("added", "deleted", "modified"):
+                continue
+            for side, tree in (("before", self.original_tree), ("after", self.modified_tree)):
+                if details[side]["exists"] and details[side]["lines"] is None and time.monotonic() < deadline:
+                    try:
+                        details[side]["lines"] = self.fingerprint_tree_file(tree, file)[1]
+                    except OSError as e:
+                        record_error(file, side, e)
+        
+        probably_unchanged = [f for f, d in self.report["file_details"].items() if d["status"] == "probably_unchanged"]
+        unverified = [f for f, d in self.report["file_details"].items() if d["status"] == "unverified"]
+        # 読み込めなかったファイルは内容を確認できていないため未検証と同じ重みで数える
+        unreadable = [f for f, d in self.report["file_details"].items() if d["status"] == "error"]
+        common = len(original_files & modified_files)
+        risk = (len(probably_unchanged) * self.BUDGET_RISK_SAME_STAT
+                + (len(unverified) + len(unreadable)) * self.BUDGET_RISK_MTIME_CHANGED)
+        self.report["modified_files"].sort()
+        self.report["suspicious_changes"].sort(key=lambda change: change["file"])
+        self.report["errors"].sort(key=lambda error: (error["file"], error["side"]))
+        self.report["directory_summary"] = self.summarize_directories()
+        self.report["budget"] = {
+            "time_budget": time_budget,
+            "elapsed": round(time.monotonic() - started, 3),
+            "candidates": len(candidates),
+            "verified": verified,
+            "probably_unchanged_files": probably_unchanged,
+            "unverified_files": unverified,
+            "confidence": round(1 - risk / common, 4) if common else 1.0
+        }
+    
+    def record_modified(self, file):
+        """変更ファイルとして記録し、保護ファイルなら要確認に追加"""
+        self.report["modified_files"].append(file)
+        if self.is_protected(file):
+            self.report["suspicious_changes"].append({
+                "file": file,
+                "reason": "保護されたファイルが変更されています"
+            })
+    
+    def compute_churn(self, filepath, original_path=None):
+        """追加・削除行数を行ハッシュの列の差分（SequenceMatcher）で求める
         
-        with open(mod_path, 'r', encoding='utf-8') as f:
-            mod_lines = f.readlines()
+        差分テキストは生成せず、保持するのは1行につき8バイトのハッシュのみ。
+        差分表示と同じく行の順序を考慮するため、入れ替え・移動した行も追加・削除として数える。
+        """
+        original_path = original_path or filepath
+        before = [hashlib.blake2b(line.rstrip(b'\r\n'), digest_size=8).digest()
+                  for line in self.original_tree.iter_lines(original_path)]
+        after = [hashlib.blake2b(line.rstrip(b'\r\n'), digest_size=8).digest()
+                 for line in self.modified_tree.iter_lines(filepath)]
+        matched = sum(block.size for block in difflib.SequenceMatcher(None, before, after).get_matching_blocks())
+        return len(after) - matched, len(before) - matched
+    
+    def render_diff_fragment(self, filepath, original_path=None):
+        """変更ファイル1件分の差分HTML断片を生成"""
+        if original_path and original_path != filepath:
+            fragment = f'<h3>{original_path} → {filepath}</h3>'
+        else:
+            fragment = f'<h3>{filepath}</h3>'
+        try:
+            diff = self.show_file_diff(filepath, original_path)
+            fragment += f'<pre>{diff}</pre>'
+        except:
+            fragment += '<p>差分を表示できません</p>'
+        return fragment
+    
+    def read_diff_fragment(self, filepath, original_path=None):
+        """パイプラインで描画済みの差分断片を取得（未描画ならその場で生成）"""
+        if filepath not in self.diff_fragments:
+            return self.render_diff_fragment(filepath, original_path)
+        offset, length = self.diff_fragments[filepath]
+        self.fragment_spool.seek(offset)
+        return self.fragment_spool.read(length).decode('utf-8')
+    
+    def show_file_diff(self, filepath, original_path=None):
+        """特定ファイルの差分を表示（名前変更時は元のパスを指定）"""
+        original_path = original_path or filepath
+        orig_lines = self.read_lines(self.original_tree, original_path)
+        mod_lines = self.read_lines(self.modified_tree, filepath)
         
         diff = difflib.unified_diff(
             orig_lines, mod_lines,
-            fromfile=f'original/{filepath}',
+            fromfile=f'original/{original_path}',
             tofile=f'modified/{filepath}',
             lineterm=''
         )
         
         return '\n'.join(diff)
     
+    def read_lines(self, tree, filepath):
+        """ツリー内のファイルを行単位で読み込む"""
+        text = tree.read_bytes(filepath).decode('utf-8')
+        return io.StringIO(text, newline=None).readlines()
+    
     def generate_html_report(self):
         """視覚的なHTMLレポートを生成"""
         # 統計情報の計算
         total_before = sum(1 for f in self.report["file_details"].values() if f["before"]["exists"])
         total_after = sum(1 for f in self.report["file_details"].values() if f["after"]["exists"])
-        lines_before = sum(f["before"]["lines"] for f in self.report["file_details"].values())
-        lines_after = sum(f["after"]["lines"] for f in self.report["file_details"].values())
+        lines_before = sum(f["before"]["lines"] or 0 for f in self.report["file_details"].values())
+        lines_after = sum(f["after"]["lines"] or 0 for f in self.report["file_details"].values())
+        # 時間制限モードでは行数が不明（None）のファイルがある
+        unknown_lines = any(f[side]["exists"] and f[side]["lines"] is None
+                            for f in self.report["file_details"].values() for side in ("before", "after"))
+        lines_note = "、行数不明のファイルを除く" if unknown_lines else ""
         
         html = f"""
 <!DOCTYPE html>
@@ -182,6 +1193,7 @@ class DiffChecker:
         .added {{ color: green; font-weight: bold; }}
         .deleted {{ color: red; font-weight: bold; }}
         .modified {{ color: orange; font-weight: bold; }}
+        .renamed {{ color: #0066cc; font-weight: bold; }}
         .suspicious {{ background: #ffcccc; padding: 10px; margin: 10px 0; }}
         pre {{ background: #f5f5f5; padding: 10px; overflow-x: auto; }}
         .diff-add {{ background: #ccffcc; }}
@@ -207,6 +1219,7 @@ class DiffChecker:
         .file-structure .added-row {{ background-color: #d4edda !important; }}
         .file-structure .deleted-row {{ background-color: #f8d7da !important; }}
         .file-structure .modified-row {{ background-color: #fff3cd !important; }}
+        .file-structure .renamed-row {{ background-color: #d6e9f8 !important; }}
         .line-change {{ font-weight: bold; }}
         .line-increase {{ color: green; }}
         .line-decrease {{ color: red; }}
@@ -217,13 +1230,15 @@ class DiffChecker:
     <div class="summary">
         <p>実行時刻: {self.report['timestamp']}</p>
         <h3>ファイル構成サマリー</h3>
-        <p>Before: <strong>{total_before}ファイル</strong> (合計 {lines_before:,}行)</p>
-        <p>After: <strong>{total_after}ファイル</strong> (合計 {lines_after:,}行)</p>
+        <p>Before: <strong>{total_before}ファイル</strong> (合計 {lines_before:,}行{lines_note})</p>
+        <p>After: <strong>{total_after}ファイル</strong> (合計 {lines_after:,}行{lines_note})</p>
         <hr>
         <p>追加ファイル: <span class="added">{len(self.report['added_files'])}</span></p>
         <p>削除ファイル: <span class="deleted">{len(self.report['deleted_files'])}</span></p>
         <p>変更ファイル: <span class="modified">{len(self.report['modified_files'])}</span></p>
+        <p>名前変更ファイル: <span class="renamed">{len(self.report['renamed_files'])}</span></p>
         <p>未変更ファイル: {len(self.report['unchanged_files'])}</p>
+        {self.generate_budget_summary()}
     </div>
 """
         
@@ -237,6 +1252,7 @@ class DiffChecker:
                 <th>Before (行数)</th>
                 <th>After (行数)</th>
                 <th>変化</th>
+                <th>追加/削除行</th>
                 <th>ステータス</th>
             </tr>
 """
@@ -245,13 +1261,23 @@ class DiffChecker:
             details = self.report["file_details"][filename]
             
             # 行数変化の計算
-            line_change = details["after"]["lines"] - details["before"]["lines"]
-            if line_change > 0:
+            if details["before"]["lines"] is None or details["after"]["lines"] is None:
+                line_change = None
+            else:
+                line_change = details["after"]["lines"] - details["before"]["lines"]
+            if line_change is None:
+                change_text = '?'
+            elif line_change > 0:
                 change_text = f'<span class="line-change line-increase">+{line_change}</span>'
             elif line_change < 0:
                 change_text = f'<span class="line-change line-decrease">{line_change}</span>'
             else:
                 change_text = '-'
+            if "churn" in details:
+                churn_text = (f'<span class="line-change line-increase">+{details["churn"]["added"]:,}</span> / '
+                              f'<span class="line-change line-decrease">-{details["churn"]["removed"]:,}</span>')
+            else:
+                churn_text = '-'
             
             # ステータスに応じた行のクラス
             row_class = ""
@@ -261,17 +1287,24 @@ class DiffChecker:
                 row_class = "deleted-row"
             elif details["status"] == "modified":
                 row_class = "modified-row"
+            elif details["status"] == "renamed":
+                row_class = "renamed-row"
             
             # Before/After の表示
-            before_text = f'{details["before"]["lines"]:,}' if details["before"]["exists"] else '-'
-            after_text = f'{details["after"]["lines"]:,}' if details["after"]["exists"] else '-'
+            before_text, after_text = (
+                '-' if not details[side]["exists"]
+                else '?' if details[side]["lines"] is None
+                else f'{details[side]["lines"]:,}'
+                for side in ("before", "after"))
+            name_text = f'{details["from"]} → {filename}' if details["status"] == "renamed" else filename
             
             html += f"""
             <tr class="{row_class}">
-                <td>{filename}</td>
+                <td>{name_text}</td>
                 <td style="text-align: right;">{before_text}</td>
                 <td style="text-align: right;">{after_text}</td>
                 <td style="text-align: center;">{change_text}</td>
+                <td style="text-align: center;">{churn_text}</td>
                 <td><span class="{details['status']}">{details['status']}</span></td>
             </tr>
 """
@@ -281,6 +1314,41 @@ class DiffChecker:
     </div>
 """
         
+        if self.report['directory_summary']:
+            html += """
+    <h2>📁 ディレクトリ別サマリー</h2>
+    <div class="file-structure">
+        <table>
+            <tr>
+                <th>ディレクトリ</th>
+                <th>追加</th>
+                <th>削除</th>
+                <th>変更</th>
+                <th>名前変更</th>
+                <th>行数 (+/-)</th>
+            </tr>
+"""
+            for directory, counts in self.report['directory_summary'].items():
+                html += f"""
+            <tr>
+                <td>{directory}/</td>
+                <td style="text-align: right;">{counts['added']}</td>
+                <td style="text-align: right;">{counts['deleted']}</td>
+                <td style="text-align: right;">{counts['modified']}</td>
+                <td style="text-align: right;">{counts['renamed']}</td>
+                <td style="text-align: center;"><span class="line-change line-increase">+{counts['lines_added']:,}</span> / <span class="line-change line-decrease">-{counts['lines_removed']:,}</span></td>
+            </tr>
+"""
+            html += """
+        </table>
+    </div>
+"""
+        
+        if self.report['errors']:
+            html += "<h2>⚠️ 読み込めなかったファイル</h2>"
+            for error in self.report['errors']:
+                html += f'<div class="suspicious">{error["file"]} ({error["side"]}): {error["error"]}</div>'
+        
         if self.report['suspicious_changes']:
             html += "<h2>⚠️ 要確認事項</h2>"
             for change in self.report['suspicious_changes']:
@@ -300,17 +1368,34 @@ class DiffChecker:
         
         if self.report['modified_files']:
             html += "<h2>変更されたファイル</h2>"
-            for file in self.report['modified_files']:
-                html += f'<h3>{file}</h3>'
-                try:
-                    diff = self.show_file_diff(file)
-                    html += f'<pre>{diff}</pre>'
-                except:
-                    html += '<p>差分を表示できません</p>'
+            if not self.render_diffs:
+                html += '<p>時間制限モードのため差分表示は省略しました</p><ul>'
+                html += ''.join(f'<li class="modified">{file}</li>' for file in self.report['modified_files'])
+                html += '</ul>'
+            for file in self.report['modified_files'] if self.render_diffs else []:
+                html += self.read_diff_fragment(file)
+        
+        if self.report['renamed_files']:
+            html += "<h2>名前変更・移動されたファイル</h2>"
+            for rename in self.report['renamed_files']:
+                if rename['identical']:
+                    html += f'<h3>{rename["from"]} → {rename["to"]}</h3><p>内容の変更なし</p>'
+                else:
+                    html += self.read_diff_fragment(rename['to'], rename['from'])
         
         html += "</body></html>"
         return html
     
+    def generate_budget_summary(self):
+        """時間制限モードの検証状況（通常モードでは空）"""
+        budget = self.report.get("budget")
+        if not budget:
+            return ""
+        return f"""<hr>
+        <p>時間制限モード: {budget['time_budget']}秒中 {budget['elapsed']}秒使用（検証 {budget['verified']}/{budget['candidates']} 件）</p>
+        <p>おそらく未変更: {len(budget['probably_unchanged_files'])} / 未検証（更新時刻の変化あり）: {len(budget['unverified_files'])}</p>
+        <p>信頼度: <strong>{budget['confidence']:.1%}</strong></p>"""
+    
     def save_report(self, output_dir):
         """レポートを保存"""
         output_dir = Path(output_dir)
@@ -332,26 +1417,349 @@ class DiffChecker:
             f.write(f"追加: {len(self.report['added_files'])} files\n")
             f.write(f"削除: {len(self.report['deleted_files'])} files\n")
             f.write(f"変更: {len(self.report['modified_files'])} files\n")
+            f.write(f"名前変更: {len(self.report['renamed_files'])} files\n")
+            root_summary = self.report["directory_summary"].get(".")
+            if root_summary:
+                f.write(f"行数: +{root_summary['lines_added']:,} / -{root_summary['lines_removed']:,} lines\n")
             f.write(f"要確認: {len(self.report['suspicious_changes'])} items\n")
+            if self.report['errors']:
+                f.write(f"読み込みエラー: {len(self.report['errors'])} files\n")
+            if "budget" in self.report:
+                budget = self.report["budget"]
+                f.write(f"時間制限モード: 検証 {budget['verified']}/{budget['candidates']} 件"
+                        f"（おそらく未変更 {len(budget['probably_unchanged_files'])} / 未検証 {len(budget['unverified_files'])}）\n")
+                f.write(f"信頼度: {budget['confidence']:.1%}\n")
+
+class TimelineChecker:
+    """複数スナップショットの変化を1回の走査でまとめて比較"""
+    
+    def __init__(self, snapshot_paths):
+        self.checker = DiffChecker("", "")
+        self.labels = [Path(p).name[:-len(SnapshotPack.SUFFIX)] if SnapshotPack.is_pack(p) else Path(p).name
+                       for p in snapshot_paths]
+        self.trees = [self.checker.open_tree(p) for p in snapshot_paths]
+        self.states = []  # スナップショットごとの 相対パス -> (hash, lines)
+        self.report = {
+            "timestamp": datetime.now().isoformat(),
+            "snapshots": [str(p) for p in snapshot_paths],
+            "steps": [],
+            "files": {},
+            "diffs": {},
+            "errors": [],  # 読み込めなかったファイル
+            "fingerprinted_blobs": 0
+        }
+    
+    def fingerprint_all(self):
+        """全スナップショットのフィンガープリントを取得（同一内容は1回だけ読む）"""
+        lines_by_hash = {}
+        hash_by_stat = {}  # (相対パス, サイズ, 更新時刻ns) -> hash（copytreeは更新時刻を保持する）
+        for label, tree in zip(self.labels, self.trees):
+            manifest = tree.load_manifest()
+            known = manifest["files"] if manifest else {}
+            state = {}
+            for file in tree.iter_files():
+                if file in known and known[file]["hash"] is not None:
+                    state[file] = (known[file]["hash"], known[file]["lines"])
+                    lines_by_hash.setdefault(known[file]["hash"], known[file]["lines"])
+                    continue
+                try:
+                    if file in known:
+                        raise OSError(known[file].get("error", "読み込めません"))
+                    stat_key = (file,) + tree.stat(file)
+                    file_hash = tree.lookup_hash(file) or hash_by_stat.get(stat_key)
+                    if file_hash is None or file_hash not in lines_by_hash:
+                        file_hash, lines = self.checker.fingerprint_tree_file(tree, file)
+                        lines_by_hash[file_hash] = lines
+                        self.report["fingerprinted_blobs"] += 1
+                except OSError as e:
+                    # 壊れたシンボリックリンクなど。ハッシュ不明として記録し、残りの比較は続ける
+                    self.report["errors"].append({"file": file, "snapshot": label, "error": str(e)})
+                    state[file] = (None, 0)
+                    continue
+                hash_by_stat[stat_key] = file_hash
+                state[file] = (file_hash, lines_by_hash[file_hash])
+            self.states.append(state)
+    
+    def build_timeline(self):
+        """ファイルごとの履歴とステップごとの集計を作成"""
+        self.fingerprint_all()
+        files = self.report["files"]
+        for file, (file_hash, lines) in self.states[0].items():
+            files[file] = {"first_seen": self.labels[0], "deleted_at": None, "lines": lines, "events": []}
+        
+        for step in range(1, len(self.states)):
+            before, after = self.states[step - 1], self.states[step]
+            label = self.labels[step]
+            counts = {"from": self.labels[step - 1], "to": label,
+                      "added": 0, "deleted": 0, "modified": 0, "lines_delta": 0}
+            for file in sorted(before.keys() | after.keys()):
+                old, new = before.get(file), after.get(file)
+                if old and new and (old[0] == new[0] or old[0] is None or new[0] is None):
+                    # 同一内容、またはどちらかが読み込めず判定できない
+                    continue
+                if old is None:
+                    event = {"snapshot": label, "type": "added", "lines_before": 0, "lines_after": new[1]}
+                    history = files.setdefault(file, {"first_seen": label, "deleted_at": None, "events": []})
+                    history["deleted_at"] = None
+                elif new is None:
+                    event = {"snapshot": label, "type": "deleted", "lines_before": old[1], "lines_after": 0}
+                    history = files[file]
+                    history["deleted_at"] = label
+                else:
+                    event = {"snapshot": label, "type": "modified", "lines_before": old[1], "lines_after": new[1]}
+                    history = files[file]
+                event["delta"] = event["lines_after"] - event["lines_before"]
+                history["lines"] = event["lines_after"]
+                history["events"].append(event)
+                counts[event["type"]] += 1
+                counts["lines_delta"] += event["delta"]
+            self.report["steps"].append(counts)
+    
+    def render_file_diffs(self, filepath):
+        """指定ファイルの各ステップの差分を生成（要求されたファイルのみ）"""
+        diffs = []
+        for step in range(1, len(self.trees)):
+            before, after = self.states[step - 1].get(filepath), self.states[step].get(filepath)
+            if before == after or (before and after and before[0] == after[0]):
+                continue
+            try:
+                old_lines = self.checker.read_lines(self.trees[step - 1], filepath) if before else []
+                new_lines = self.checker.read_lines(self.trees[step], filepath) if after else []
+                text = '\n'.join(difflib.unified_diff(
+                    old_lines, new_lines,
+                    fromfile=f'{self.labels[step - 1]}/{filepath}',
+                    tofile=f'{self.labels[step]}/{filepath}',
+                    lineterm=''
+                ))
+            except (UnicodeDecodeError, OSError):
+                text = None
+            diffs.append({"from": self.labels[step - 1], "to": self.labels[step], "diff": text})
+        self.report["diffs"][filepath] = diffs
+        return diffs
+    
+    def generate_html_report(self):
+        """タイムラインのHTMLレポートを生成"""
+        changed = {file: history for file, history in self.report["files"].items() if history["events"]}
+        html = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>AI作業監視タイムラインレポート</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        .summary {{ background: #f0f0f0; padding: 15px; border-radius: 5px; }}
+        .added {{ color: green; font-weight: bold; }}
+        .deleted {{ color: red; font-weight: bold; }}
+        .modified {{ color: orange; font-weight: bold; }}
+        pre {{ background: #f5f5f5; padding: 10px; overflow-x: auto; }}
+        table {{ border-collapse: collapse; width: 100%; margin: 10px 0; font-family: 'Courier New', monospace; }}
+        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+        th {{ background-color: #f2f2f2; }}
+    </style>
+</head>
+<body>
+    <h1>AI作業監視タイムラインレポート</h1>
+    <div class="summary">
+        <p>実行時刻: {self.report['timestamp']}</p>
+        <p>スナップショット: <strong>{len(self.labels)}</strong>件（{self.labels[0]} 〜 {self.labels[-1]}）</p>
+        <p>変化のあったファイル: <strong>{len(changed)}</strong></p>
+        <p>読み込んだ内容（重複を除く）: {self.report['fingerprinted_blobs']}</p>
+    </div>
+"""
+        if self.report["errors"]:
+            html += "<h2>⚠️ 読み込めなかったファイル</h2>"
+            for error in self.report["errors"]:
+                html += f'<p class="deleted">{error["snapshot"]}/{error["file"]}: {error["error"]}</p>'
+        html += """
+
+    <h2>📈 ステップ別サマリー</h2>
+    <table>
+        <tr><th>From</th><th>To</th><th>追加</th><th>削除</th><th>変更</th><th>行数変化</th></tr>
+"""
+        for step in self.report["steps"]:
+            html += f"""
+        <tr>
+            <td>{step['from']}</td>
+            <td>{step['to']}</td>
+            <td class="added">{step['added']}</td>
+            <td class="deleted">{step['deleted']}</td>
+            <td class="modified">{step['modified']}</td>
+            <td>{step['lines_delta']:+,}</td>
+        </tr>
+"""
+        html += """
+    </table>
+
+    <h2>📋 ファイル別履歴</h2>
+    <table>
+        <tr><th>ファイル名</th><th>初出</th><th>変化</th><th>削除</th></tr>
+"""
+        for file, history in sorted(changed.items()):
+            events = '<br>'.join(
+                f'<span class="{event["type"]}">{event["snapshot"]}: {event["type"]} ({event["delta"]:+,})</span>'
+                for event in history["events"])
+            html += f"""
+        <tr>
+            <td>{file}</td>
+            <td>{history['first_seen']}</td>
+            <td>{events}</td>
+            <td>{history['deleted_at'] or '-'}</td>
+        </tr>
+"""
+        html += """
+    </table>
+"""
+        for file, diffs in self.report["diffs"].items():
+            html += f'<h2>差分: {file}</h2>'
+            for diff in diffs:
+                html += f'<h3>{diff["from"]} → {diff["to"]}</h3>'
+                html += f'<pre>{diff["diff"]}</pre>' if diff["diff"] is not None else '<p>差分を表示できません</p>'
+        html += "</body></html>"
+        return html
+    
+    def save_report(self, output_dir):
+        """レポートを保存"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        with open(output_dir / 'timeline.json', 'w', encoding='utf-8') as f:
+            json.dump(self.report, f, ensure_ascii=False, indent=2)
+        
+        with open(output_dir / 'timeline.html', 'w', encoding='utf-8') as f:
+            f.write(self.generate_html_report())
+        
+        with open(output_dir / 'timeline-summary.txt', 'w', encoding='utf-8') as f:
+            f.write(f"AI作業監視タイムライン\n")
+            f.write(f"================\n")
+            f.write(f"実行時刻: {self.report['timestamp']}\n")
+            for step in self.report["steps"]:
+                f.write(f"{step['from']} → {step['to']}: 追加 {step['added']} / 削除 {step['deleted']}"
+                        f" / 変更 {step['modified']} / 行数 {step['lines_delta']:+,}\n")
+            if self.report["errors"]:
+                f.write(f"読み込みエラー: {len(self.report['errors'])} files\n")
+
+def parse_options(argv, defaults, flags=()):
+    """位置引数と --name value 形式のオプションを分離（flagsは値を取らない）"""
+    args = []
+    options = dict(defaults)
+    i = 0
+    while i < len(argv):
+        if argv[i].startswith('--') and argv[i][2:].replace('-', '_') in flags:
+            options[argv[i][2:].replace('-', '_')] = True
+            i += 1
+        elif argv[i].startswith('--') and i + 1 < len(argv):
+            options[argv[i][2:].replace('-', '_')] = argv[i + 1]
+            i += 2
+        else:
+            args.append(argv[i])
+            i += 1
+    return args, options
+
+def parse_time_budget(value):
+    """--time-budget の値を秒数に変換（未指定ならNone）"""
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = -1
+    if not seconds >= 0:
+        raise ValueError(f"time_budget には0以上の秒数を指定してください: {value}")
+    return seconds
 
 def main():
-    if len(sys.argv) < 3:
-        print("使用方法: python diff-checker.py [original_dir] [modified_dir]")
+    args, options = parse_options(sys.argv[1:], {
+        "hash_workers": 4,
+        "diff_workers": 2,
+        "queue_size": 256,
+        "time_budget": None,
+        "keep_last": 5,
+        "hourly": 24,
+        "daily": 7,
+        "weekly": 4,
+        "keep_loose": 1,
+        "compression": "zlib",
+        "dry_run": False,
+        "diff": None,
+        "output": None
+    }, flags=("dry_run",))
+    if len(args) < 2:
+        print("使用方法: python diff-checker.py [original_dir] [modified_dir] [--hash-workers N] [--diff-workers N] [--queue-size N] [--time-budget 秒]")
         print("または: python diff-checker.py snapshot [source_dir]")
+        print("または: python diff-checker.py gc [source_dir] [--keep-last N] [--hourly N] [--daily N] [--weekly N] [--keep-loose N] [--compression zlib|lzma] [--dry-run]")
+        print("または: python diff-checker.py timeline [snapshot ...] [--diff ファイル] [--output 出力先]")
+        print("　　　  （source_dir を1つだけ指定した場合はそのプロジェクトの全スナップショット）")
+        print("（original_dir にはパック化されたスナップショット *.pack も指定可能）")
         sys.exit(1)
     
-    if sys.argv[1] == "snapshot":
+    if args[0] == "snapshot":
         # スナップショット作成モード
         checker = DiffChecker("", "")
-        snapshot_path = checker.create_snapshot(sys.argv[2])
+        snapshot_path = checker.create_snapshot(args[1])
         print(f"スナップショット作成完了: {snapshot_path}")
+    elif args[0] == "gc":
+        # 保持ポリシーに従ってスナップショットを削除・パック化
+        store = SnapshotStore(Path(args[1]).resolve().name)
+        try:
+            result = store.gc(
+                keep_last=int(options["keep_last"]),
+                hourly=int(options["hourly"]),
+                daily=int(options["daily"]),
+                weekly=int(options["weekly"]),
+                keep_loose=int(options["keep_loose"]),
+                compression=options["compression"],
+                dry_run=options["dry_run"])
+        except ValueError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        print(f"{prefix}スナップショットGC完了: {store.project_dir}")
+        print(f"{prefix}保持: {len(result['kept'])} 件 / 削除: {len(result['deleted'])} 件 / パック化: {len(result['packed'])} 件")
+        print(f"{prefix}使用量: {result['bytes_before']:,} → {result['bytes_after']:,} bytes"
+              f"（ファイル数 {result['files_before']:,} → {result['files_after']:,}）")
+        for path in result["mismatched"]:
+            print(f"警告: パックの内容が一致しないため削除しませんでした: {path}")
+    elif args[0] == "timeline":
+        # 複数スナップショットの時系列比較モード
+        if len(args) == 2:
+            snapshots = [sorted(paths, key=lambda p: p.is_file())[0]
+                         for _, paths in reversed(SnapshotStore(Path(args[1]).resolve().name).list_snapshots())]
+        else:
+            snapshots = args[1:]
+        if len(snapshots) < 2:
+            print("タイムライン比較には2件以上のスナップショットが必要です")
+            sys.exit(1)
+        timeline = TimelineChecker(snapshots)
+        timeline.build_timeline()
+        if options["diff"]:
+            timeline.render_file_diffs(options["diff"])
+        
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        time_str = datetime.now().strftime('%H%M%S')
+        report_dir = Path(options["output"] or Path('management') / 'checker' / 'reports' / date_str / f'timeline-{time_str}')
+        timeline.save_report(report_dir)
+        print(f"タイムラインレポート生成完了: {report_dir}")
+        print(f"HTMLレポート: {report_dir}/timeline.html")
+        print(f"スナップショット: {len(snapshots)} 件 / 読み込んだ内容: {timeline.report['fingerprinted_blobs']} 件")
     else:
         # 比較モード
-        checker = DiffChecker(sys.argv[1], sys.argv[2])
-        checker.compare_directories()
+        try:
+            checker = DiffChecker(
+                args[0], args[1],
+                hash_workers=int(options["hash_workers"]),
+                diff_workers=int(options["diff_workers"]),
+                queue_size=int(options["queue_size"]))
+            time_budget = parse_time_budget(options["time_budget"])
+        except ValueError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        if time_budget is not None:
+            checker.compare_with_budget(time_budget)
+        else:
+            checker.compare_directories()
         
         # レポート保存（プロジェクト内に変更）
-        project_dir = Path(sys.argv[2])
+        project_dir = Path(args[1])
         date_str = datetime.now().strftime('%Y-%m-%d')
         time_str = datetime.now().strftime('%H%M%S')
         report_dir = project_dir / 'management' / 'checker' / 'reports' / date_str / time_str
@@ -360,6 +1768,9 @@ def main():
         print(f"レポート生成完了: {report_dir}")
         print(f"HTMLレポート: {report_dir}/report.html")
         print(f"要確認事項: {len(checker.report['suspicious_changes'])} 件")
+        if "budget" in checker.report:
+            print(f"信頼度: {checker.report['budget']['confidence']:.1%}"
+                  f"（検証 {checker.report['budget']['verified']}/{checker.report['budget']['candidates']} 件）")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
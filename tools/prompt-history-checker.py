@@ -10,8 +10,21 @@ import re
 from pathlib import Path
 from datetime import datetime
 import json
+from datetime import timezone, timedelta
+
+JST = timezone(timedelta(hours=9))
 
 class PromptHistoryChecker:
+    # 対象チーム: (プロジェクト内のパス, 表示名)
+    TEAMS = [
+        ("development", "開発チーム"),
+        ("management/writer", "マネジメント・ライター"),
+        ("management/checker", "マネジメント・チェッカー"),
+        ("management/reviewer", "マネジメント・レビュワー")
+    ]
+    # 作業記録・プロンプトのエントリ見出し（## YYYY-MM-DD HH:MM:SS JST パターン）
+    ENTRY_PATTERN = r'^## (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) JST'
+    
     def __init__(self, project_dir):
         self.project_dir = Path(project_dir)
         self.report = {
@@ -38,18 +51,34 @@ class PromptHistoryChecker:
         except:
             return 0
     
+    def parse_entry_times(self, filepath):
+        """エントリ見出しの時刻（JST）を出現順に取得"""
+        if not filepath.exists():
+            return []
+        
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except:
+            return []
+        times = []
+        for match in re.finditer(self.ENTRY_PATTERN, content, re.MULTILINE):
+            try:
+                times.append(datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').replace(tzinfo=JST))
+            except ValueError:
+                continue
+        return times
+    
     def check_team_compliance(self, team_path, team_name):
         """チームの対応状況をチェック"""
         work_history_path = team_path / 'work_history.log'
         prompt_path = team_path / 'prompt.txt'
         
-        # 作業履歴のエントリ数をカウント（## YYYY-MM-DD HH:MM:SS JST パターン）
-        history_pattern = r'^## \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} JST'
-        history_count = self.count_entries_in_file(work_history_path, history_pattern)
+        # 作業履歴のエントリ数をカウント
+        history_count = self.count_entries_in_file(work_history_path, self.ENTRY_PATTERN)
         
-        # プロンプトのエントリ数をカウント（## YYYY-MM-DD HH:MM:SS JST パターン）
-        prompt_pattern = r'^## \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} JST'
-        prompt_count = self.count_entries_in_file(prompt_path, prompt_pattern)
+        # プロンプトのエントリ数をカウント
+        prompt_count = self.count_entries_in_file(prompt_path, self.ENTRY_PATTERN)
         
         # 結果記録
         team_info = {
@@ -81,35 +110,12 @@ class PromptHistoryChecker:
         teams_found = 0
         compliant_teams = 0
         
-        # 開発チーム
-        dev_path = self.project_dir / 'development'
-        if dev_path.exists():
-            teams_found += 1
-            if self.check_team_compliance(dev_path, "開発チーム"):
-                compliant_teams += 1
-        
-        # マネジメントチーム
-        mgmt_path = self.project_dir / 'management'
-        if mgmt_path.exists():
-            # ライター
-            writer_path = mgmt_path / 'writer'
-            if writer_path.exists():
-                teams_found += 1
-                if self.check_team_compliance(writer_path, "マネジメント・ライター"):
-                    compliant_teams += 1
-            
-            # チェッカー
-            checker_path = mgmt_path / 'checker'
-            if checker_path.exists():
-                teams_found += 1
-                if self.check_team_compliance(checker_path, "マネジメント・チェッカー"):
-                    compliant_teams += 1
-            
-            # レビュワー
-            reviewer_path = mgmt_path / 'reviewer'
-            if reviewer_path.exists():
+        # 開発チーム・マネジメントチーム（ライター、チェッカー、レビュワー）
+        for team_dir, team_name in self.TEAMS:
+            team_path = self.project_dir / team_dir
+            if team_path.exists():
                 teams_found += 1
-                if self.check_team_compliance(reviewer_path, "マネジメント・レビュワー"):
+                if self.check_team_compliance(team_path, team_name):
                     compliant_teams += 1
         
         # サマリー更新
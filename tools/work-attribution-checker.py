@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+作業記録・ファイル変更対応チェックツール v0.1
+差分チェック（DiffChecker）とプロンプト履歴チェック（PromptHistoryChecker）を組み合わせ、
+変更されたファイルがどのチームの作業記録に対応するかを判定する
+
+- 変更時刻をカバーする作業記録がないファイル
+- 変更時刻をカバーするチームの権限範囲（management/PERMISSIONS.md）外のファイル
+を要確認として報告する
+"""
+
+import re
+import sys
+import json
+import bisect
+import importlib.util
+from datetime import datetime, timedelta
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+
+
+def load_tool(filename, module_name):
+    """ハイフン付きファイル名のツールをモジュールとして読み込む"""
+    spec = importlib.util.spec_from_file_location(module_name, TOOLS_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class IntervalIndex:
+    """区間 [start, end] の集合に対し、ある時刻を含む区間を O(log n + k) で求める索引"""
+
+    def __init__(self, intervals):
+        # (start, end, value) を開始時刻順に並べ、end の累積最大値を持っておく
+        self.intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in self.intervals]
+        self.max_ends = []
+        max_end = None
+        for _, end, _ in self.intervals:
+            max_end = end if max_end is None or end > max_end else max_end
+            self.max_ends.append(max_end)
+
+    def query(self, point):
+        """point を含む区間の value を返す"""
+        result = []
+        i = bisect.bisect_right(self.starts, point) - 1
+        # 手前の区間の end の最大値が point 未満になれば、それ以前に該当区間はない
+        while i >= 0 and self.max_ends[i] >= point:
+            start, end, value = self.intervals[i]
+            if end >= point:
+                result.append(value)
+            i -= 1
+        return result
+
+
+class WorkAttributionChecker:
+    # 作業記録の時刻がカバーする範囲（記録は作業直後に書かれるため前側を広く取る）
+    DEFAULT_WINDOW_BEFORE = timedelta(minutes=30)
+    DEFAULT_WINDOW_AFTER = timedelta(minutes=5)
+    # PERMISSIONS.md の見出し -> 対象チーム
+    PERMISSION_SECTIONS = {
+        "開発チーム": ["development"],
+        "マネジメントチーム": ["management/writer", "management/checker", "management/reviewer"]
+    }
+    # PERMISSIONS.md の記載にかかわらず各チームが更新してよい自チームのファイル
+    DEFAULT_TEAM_FILES = ('work_history.log', 'prompt.txt')
+
+    def __init__(self, project_dir, snapshot_dir, window_before=None, window_after=None):
+        self.project_dir = Path(project_dir)
+        self.snapshot_dir = Path(snapshot_dir)
+        self.window_before = window_before or self.DEFAULT_WINDOW_BEFORE
+        self.window_after = window_after or self.DEFAULT_WINDOW_AFTER
+        self.diff_module = load_tool('diff-checker.py', 'diff_checker')
+        self.prompt_module = load_tool('prompt-history-checker.py', 'prompt_history_checker')
+        self.report = {
+            "timestamp": datetime.now().isoformat(),
+            "snapshot": str(self.snapshot_dir),
+            "window_minutes": {
+                "before": self.window_before.total_seconds() / 60,
+                "after": self.window_after.total_seconds() / 60
+            },
+            "teams": {},
+            "files": [],
+            "summary": {
+                "changed_files": 0,
+                "attributed_files": 0,
+                "uncovered_files": 0,
+                "outside_area_files": 0,
+                "undetermined_files": 0
+            }
+        }
+
+    def build_interval_index(self):
+        """全チームの work_history.log から区間索引を作成"""
+        prompt_checker = self.prompt_module.PromptHistoryChecker(self.project_dir)
+        intervals = []
+        for team_dir, team_name in prompt_checker.TEAMS:
+            times = prompt_checker.parse_entry_times(self.project_dir / team_dir / 'work_history.log')
+            self.report["teams"][team_dir] = {"name": team_name, "entries": len(times)}
+            for entry_time in times:
+                intervals.append((
+                    entry_time.timestamp() - self.window_before.total_seconds(),
+                    entry_time.timestamp() + self.window_after.total_seconds(),
+                    (team_dir, entry_time)
+                ))
+        return IntervalIndex(intervals)
+
+    def load_permissions(self):
+        """PERMISSIONS.md から各チームの編集可能範囲を読み込む
+
+        戻り値: チーム -> ルールのリスト。ルールは ("all",)、("file", パス)、("dir", パス)
+        パスはプロジェクトからの相対パス（resolve_rule_path で実際の位置に固定する）
+        """
+        areas = {
+            team_dir: [("file", f'{team_dir}/{name}') for name in self.DEFAULT_TEAM_FILES]
+            for section in self.PERMISSION_SECTIONS.values() for team_dir in section
+        }
+        path = self.project_dir / 'management' / 'PERMISSIONS.md'
+        if not path.exists():
+            return areas
+
+        teams = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('## '):
+                    teams = self.PERMISSION_SECTIONS.get(line[3:].strip(), [])
+                    continue
+                if not line.startswith('- ') or not teams:
+                    continue
+                item = line[2:].strip()
+                rules = []
+                if item.startswith('すべて編集可能'):
+                    rules.append(("all",))
+                elif item.startswith('編集可能:') or item.startswith('新規作成可能:'):
+                    for name in re.split(r'[,、]', item.split(':', 1)[1]):
+                        name = name.strip()
+                        if name.endswith('フォルダとその中身'):
+                            rules.append(("dir", name[:-len('フォルダとその中身')]))
+                        elif name:
+                            rules.append(("file", name))
+                for team_dir in teams:
+                    areas[team_dir].extend(
+                        rule if rule[0] == "all" else (rule[0], self.resolve_rule_path(team_dir, rule[1]))
+                        for rule in rules)
+        return areas
+
+    def resolve_rule_path(self, team_dir, name):
+        """PERMISSIONS.md の名前をプロジェクト内の実際のパスに固定する
+
+        チームのディレクトリ内を優先し、そこになくプロジェクト直下にあれば直下のものとする
+        （例: work → development/work、CLAUDE.md → CLAUDE.md）
+        """
+        if (self.project_dir / name).exists() and not (self.project_dir / team_dir / name).exists():
+            return name
+        return f'{team_dir}/{name}'
+
+    def in_area(self, file, rules):
+        """ファイルがルールで許可された範囲内かどうか（パスは先頭から一致するもののみ）"""
+        path = Path(file).as_posix()
+        for rule in rules:
+            if rule[0] == "all":
+                return True
+            if rule[0] == "file" and path.lower() == rule[1].lower():
+                return True
+            if rule[0] == "dir" and path.startswith(rule[1] + '/'):
+                return True
+        return False
+
+    def check(self):
+        """変更ファイルと作業記録を時刻で突き合わせる"""
+        checker = self.diff_module.DiffChecker(self.snapshot_dir, self.project_dir)
+        checker.compare_directories(render_diffs=False)
+        changed = [
+            (file, details["status"])
+            for file, details in checker.report["file_details"].items()
+            if details["status"] in ("added", "modified", "renamed")
+        ]
+        # mv は更新時刻を保持するため、内容を変えない移動は時刻から作業記録を特定できない
+        pure_renames = {rename["to"] for rename in checker.report["renamed_files"] if rename["identical"]}
+
+        # 変更時刻順に並べ、各ファイルを区間索引で検索（O((files + entries) log n)）
+        mtimes = {file: checker.modified_tree.stat(file)[1] / 1e9 for file, _ in changed}
+        index = self.build_interval_index()
+        areas = self.load_permissions()
+        summary = self.report["summary"]
+        for file, status in sorted(changed, key=lambda item: mtimes[item[0]]):
+            covering = index.query(mtimes[file])
+            teams = sorted({team_dir for team_dir, _ in covering})
+            entry = {
+                "file": file,
+                "status": status,
+                "mtime": datetime.fromtimestamp(mtimes[file], self.prompt_module.JST).strftime('%Y-%m-%d %H:%M:%S JST'),
+                "teams": teams,
+                "entries": sorted({entry_time.strftime('%Y-%m-%d %H:%M:%S JST') for _, entry_time in covering}),
+                "issue": None,
+                "note": None
+            }
+            if file in pure_renames:
+                entry["teams"] = []
+                entry["entries"] = []
+                entry["note"] = "内容を変えない移動のため判定不可（変更時刻が移動前のまま）"
+                summary["undetermined_files"] += 1
+            elif not teams:
+                entry["issue"] = "対応する作業記録がありません"
+                summary["uncovered_files"] += 1
+            elif not any(self.in_area(file, areas.get(team_dir, [])) for team_dir in teams):
+                entry["issue"] = f"権限範囲外の変更です（{', '.join(teams)}）"
+                summary["outside_area_files"] += 1
+            else:
+                summary["attributed_files"] += 1
+            self.report["files"].append(entry)
+        summary["changed_files"] = len(changed)
+
+    def generate_html_report(self):
+        """HTMLレポートを生成"""
+        summary = self.report['summary']
+        html = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>作業記録・ファイル変更対応チェックレポート</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        .summary {{ background: #f0f0f0; padding: 15px; border-radius: 5px; margin-bottom: 20px; }}
+        .compliant {{ color: green; font-weight: bold; }}
+        .non-compliant {{ color: red; font-weight: bold; }}
+        .issue-row {{ background: #fff0f0; }}
+        .note-row {{ background: #f8f8e0; }}
+        table {{ border-collapse: collapse; width: 100%; margin: 10px 0; }}
+        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+        th {{ background-color: #f2f2f2; }}
+    </style>
+</head>
+<body>
+    <h1>作業記録・ファイル変更対応チェックレポート</h1>
+
+    <div class="summary">
+        <h2>📊 サマリー</h2>
+        <p>実行時刻: {self.report['timestamp']}</p>
+        <p>比較基準: {self.report['snapshot']}</p>
+        <p>変更ファイル: <strong>{summary['changed_files']}</strong></p>
+        <p>作業記録と対応: <span class="compliant">{summary['attributed_files']}</span></p>
+        <p>作業記録なし: <span class="non-compliant">{summary['uncovered_files']}</span></p>
+        <p>権限範囲外: <span class="non-compliant">{summary['outside_area_files']}</span></p>
+        <p>判定不可: {summary['undetermined_files']}</p>
+    </div>
+
+    <h2>📋 ファイル別詳細</h2>
+    <table>
+        <tr>
+            <th>ファイル名</th>
+            <th>ステータス</th>
+            <th>変更時刻</th>
+            <th>対応チーム</th>
+            <th>問題点</th>
+        </tr>
+"""
+        for entry in self.report['files']:
+            row_class = "issue-row" if entry['issue'] else "note-row" if entry['note'] else ""
+            teams = ', '.join(self.report['teams'][team]['name'] for team in entry['teams']) or '-'
+            html += f"""
+        <tr class="{row_class}">
+            <td>{entry['file']}</td>
+            <td>{entry['status']}</td>
+            <td>{entry['mtime']}</td>
+            <td>{teams}</td>
+            <td>{entry['issue'] or entry['note'] or '-'}</td>
+        </tr>
+"""
+        html += """
+    </table>
+</body>
+</html>
+"""
+        return html
+
+    def save_report(self, output_dir):
+        """レポートを保存"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # JSON形式で保存
+        with open(output_dir / 'attribution-report.json', 'w', encoding='utf-8') as f:
+            json.dump(self.report, f, ensure_ascii=False, indent=2)
+
+        # HTML形式で保存
+        with open(output_dir / 'attribution-report.html', 'w', encoding='utf-8') as f:
+            f.write(self.generate_html_report())
+
+        # 簡易テキストレポート
+        summary = self.report['summary']
+        with open(output_dir / 'attribution-summary.txt', 'w', encoding='utf-8') as f:
+            f.write(f"作業記録・ファイル変更対応チェック結果\n")
+            f.write(f"========================================\n")
+            f.write(f"実行時刻: {self.report['timestamp']}\n")
+            f.write(f"変更ファイル: {summary['changed_files']}\n")
+            f.write(f"作業記録と対応: {summary['attributed_files']}\n")
+            f.write(f"作業記録なし: {summary['uncovered_files']}\n")
+            f.write(f"権限範囲外: {summary['outside_area_files']}\n")
+            f.write(f"判定不可: {summary['undetermined_files']}\n")
+            issues = [entry for entry in self.report['files'] if entry['issue']]
+            if issues:
+                f.write(f"\n問題:\n")
+                for entry in issues:
+                    f.write(f"- {entry['file']}: {entry['issue']}\n")
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    options = {}
+    for name in ('--snapshot', '--window-before', '--window-after'):
+        if name in sys.argv and sys.argv.index(name) + 1 < len(sys.argv):
+            value = sys.argv[sys.argv.index(name) + 1]
+            options[name] = value
+            if value in args:
+                args.remove(value)
+
+    if not args:
+        print("使用方法: python work-attribution-checker.py [project_directory] [--snapshot snapshot_dir] [--window-before 分] [--window-after 分]")
+        sys.exit(1)
+
+    project_dir = Path(args[0])
+    snapshot_dir = options.get('--snapshot')
+    if snapshot_dir is None:
+        latest = Path.home() / '.ai-monitor' / 'snapshots' / project_dir.resolve().name / 'latest'
+        if not latest.exists():
+            print(f"スナップショットがありません: {latest}")
+            print("作成方法: python diff-checker.py snapshot [source_dir]")
+            sys.exit(1)
+        snapshot_dir = latest.resolve()
+
+    checker = WorkAttributionChecker(
+        project_dir, snapshot_dir,
+        window_before=timedelta(minutes=float(options['--window-before'])) if '--window-before' in options else None,
+        window_after=timedelta(minutes=float(options['--window-after'])) if '--window-after' in options else None)
+    checker.check()
+
+    # レポート保存
+    date_str = datetime.now().strftime('%Y-%m-%d')
+    time_str = datetime.now().strftime('%H%M%S')
+    report_dir = project_dir / 'management' / 'checker' / 'reports' / 'tool-reports' / date_str / f"attribution-check-{time_str}"
+    checker.save_report(report_dir)
+
+    summary = checker.report['summary']
+    print(f"作業記録・ファイル変更対応チェック完了: {report_dir}")
+    print(f"HTMLレポート: {report_dir}/attribution-report.html")
+    print(f"対応: {summary['attributed_files']}/{summary['changed_files']} ファイル"
+          f"（作業記録なし {summary['uncovered_files']} / 権限範囲外 {summary['outside_area_files']}"
+          f" / 判定不可 {summary['undetermined_files']}）")
+
+if __name__ == "__main__":
+    main()